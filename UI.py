@@ -1,36 +1,119 @@
 '''Python 3.9.4'''
+import queue
+import logging
+import threading
 from tkinter import *
+from concurrent.futures import ThreadPoolExecutor
 
 from driver_interface import *
+from messagelog import MessageLog
 import scheduler
 
+logging.basicConfig(level=logging.INFO, format='%(message)s') #show dispatched commands
 MockRobot_Driver = DriverInterface() #create driver instance
 
-def buttonpress(function, *args):
-    #performs the driver function and prints return to text box
-    execution_status = function(*args)
-    msg_list.insert(END, f'{execution_status}')
-    msg_list.see(END)
-
-def update_status():
-    #constantly updates process status of robot
-    processStatus = MockRobot_Driver.processStatus
-    lbl_processStatus.config(text=f'MockRobot Process Status: {processStatus}')
-    root.after(100, update_status)
-
-def update_connection():
-    #constantly updates connection status to robot
-    connected = MockRobot_Driver.connected
-    if connected:
-        lbl_connectionStatus.config(text=f'MockRobot Connection Status: Connected')
+#driver calls run one at a time in order on a worker, so a slow call never freezes the window
+driver_calls = ThreadPoolExecutor(max_workers=1)
+#changes from driver threads, drained on the Tk thread when <<DriverEvent>> is signalled
+events = queue.Queue()
+signalled = threading.Event() #set while a <<DriverEvent>> is on its way, so bursts signal once
+message_log = MessageLog(10000) #last messages, only the visible rows are put in msg_list
+log_top = 0 #int: index into message_log of first visible row
+follow_log = True #boolean: keep showing newest messages, false once scrolled up
+
+def notify(name, value):
+    #hands a change over to the Tk thread, called from any thread
+    events.put((name, value))
+    if not signalled.is_set():
+        signalled.set()
+        try:
+            root.event_generate('<<DriverEvent>>', when='tail')
+        except (TclError, RuntimeError): #window closed or not yet looping
+            signalled.clear()
+
+def buttonpress(function, *args, serial=True):
+    #performs the driver function on the worker and prints return to text box
+    #serial=False runs it on its own thread instead, so it never waits behind a stuck call
+    def call():
+        try:
+            execution_status = function(*args)
+        except Exception as e:
+            execution_status = f'<DRIVER ERROR> {e}'
+        notify('message', f'{execution_status}')
+    if serial:
+        driver_calls.submit(call)
     else:
-        lbl_connectionStatus.config(text=f'MockRobot Connection Status: Not Connected')
-    root.after(100, update_connection)
+        threading.Thread(target=call, daemon=True).start()
+
+def drain_events(event=None):
+    #applies every change queued since the last signal, redrawing the log once
+    signalled.clear()
+    log_changed = False
+    while True:
+        try:
+            name, value = events.get_nowait()
+        except queue.Empty:
+            break
+        if name == 'processStatus':
+            lbl_processStatus.config(text=f'MockRobot Process Status: {value}')
+        elif name == 'connected' and value:
+            lbl_connectionStatus.config(text=f'MockRobot Connection Status: Connected')
+        elif name == 'connected':
+            lbl_connectionStatus.config(text=f'MockRobot Connection Status: Not Connected')
+        elif name == 'message':
+            message_log.append(value)
+            log_changed = True
+    if log_changed:
+        show_log()
+
+def show_log():
+    #puts only the visible rows of the filtered log into msg_list and sizes scrollbar
+    global log_top
+    total = len(message_log)
+    rows = int(msg_list.cget('height'))
+    if follow_log:
+        log_top = total - rows
+    log_top = max(min(log_top, total - rows), 0)
+    msg_list.delete(0, END)
+    for row in message_log.rows(log_top, rows):
+        msg_list.insert(END, row)
+    if total > rows:
+        scrollbar.set(log_top / total, (log_top + rows) / total)
+    else:
+        scrollbar.set(0, 1)
+
+def scroll_log(*args):
+    #moves visible rows for scrollbar, ie. ('moveto', '0.5') or ('scroll', '-1', 'units')
+    global log_top, follow_log
+    total = len(message_log)
+    rows = int(msg_list.cget('height'))
+    if args[0] == 'moveto':
+        log_top = int(float(args[1]) * total)
+    elif args[0] == 'scroll':
+        log_top += int(args[1]) * (rows if args[2] == 'pages' else 1)
+    follow_log = log_top >= total - rows
+    show_log()
+
+def wheel_log(event):
+    #scrolls log three rows per mouse wheel notch
+    if event.num == 4 or event.delta > 0:
+        scroll_log('scroll', '-3', 'units')
+    else:
+        scroll_log('scroll', '3', 'units')
+    return 'break'
+
+def filter_log(*args):
+    #shows only messages containing the filter text
+    global follow_log
+    message_log.set_filter(log_filter.get())
+    follow_log = True
+    show_log()
 
 #Begin UI
 root = Tk()
 root.title('Device Driver GUI')
-root.geometry('525x700')
+root.geometry('525x730')
+root.bind('<<DriverEvent>>', drain_events)
 
 app = Frame(root)
 app.grid()
@@ -45,6 +128,9 @@ menu_pName1 = OptionMenu(app, pName1, *scheduler.valid_names)
 pName2 = StringVar(root)
 menu_pName2 = OptionMenu(app, pName2, *scheduler.valid_names)
 
+log_filter = StringVar(root)
+log_filter.trace_add('write', filter_log)
+
 #Define buttons
 btn_OpenConnection = Button(
     app,
@@ -53,7 +139,7 @@ btn_OpenConnection = Button(
     height=4,
     command=lambda: buttonpress(MockRobot_Driver.OpenConnection, ent_IPAddress.get(), ent_Port.get()),
 )
-btn_Abort = Button(app, width=25, height=4, text='Abort', command=lambda: buttonpress(MockRobot_Driver.Abort))
+btn_Abort = Button(app, width=25, height=4, text='Abort', command=lambda: buttonpress(MockRobot_Driver.Abort, serial=False))
 btn_Initialize = Button(app, width=25, height=4, text='Initialize', command=lambda: buttonpress(MockRobot_Driver.Initialize))
 btn_ExecuteOperation = Button(
     app,
@@ -73,6 +159,7 @@ ent_IPAddress = Entry(app, width=25, justify=LEFT)
 ent_Port = Entry(app, width=25, justify=LEFT)
 ent_pValue1 = Entry(app, width=25, justify=LEFT)
 ent_pValue2 = Entry(app, width=25, justify=LEFT)
+ent_filter = Entry(app, width=25, justify=LEFT, textvariable=log_filter)
 lbl_connectionStatus = Label(app, text=f'MockRobot Connection Status: Not Connected', width=40, height=1, justify=LEFT, anchor="w")
 lbl_processStatus = Label(app, text=f'MockRobot Process Status: ', width=40, height=1, justify=LEFT, anchor="w")
 lbl_IP = Label(app, text=f'Enter IP Address:', width=25, height=2, justify=RIGHT, anchor="e")
@@ -82,8 +169,12 @@ lbl_pName1 = Label(app, text=f'Select Source or Destination:', width=25, height=
 lbl_pValue1 = Label(app, text=f'Enter location value:', width=25, height=2, justify=RIGHT, anchor="e")
 lbl_pName2 = Label(app, text=f'Select Source or Destination:', width=25, height=2, justify=RIGHT, anchor="e")
 lbl_pValue2 = Label(app, text=f'Enter location value:', width=25, height=2, justify=RIGHT, anchor="e")
-scrollbar = Scrollbar(app)
-msg_list = Listbox(app, height=15, width=75, yscrollcommand=scrollbar.set)
+lbl_filter = Label(app, text=f'Filter messages:', width=25, height=2, justify=RIGHT, anchor="e")
+scrollbar = Scrollbar(app, command=scroll_log)
+msg_list = Listbox(app, height=15, width=75)
+msg_list.bind('<MouseWheel>', wheel_log)
+msg_list.bind('<Button-4>', wheel_log)
+msg_list.bind('<Button-5>', wheel_log)
 
 #Setup grid
 btn_OpenConnection.grid(row=2, column=3, rowspan=2)
@@ -107,8 +198,10 @@ btn_Abort.grid(row=10, column=3)
 
 lbl_connectionStatus.grid(row=11, column=1, columnspan=2)
 lbl_processStatus.grid(row=12, column=1, columnspan=2)
-msg_list.grid(row=13, column=1, columnspan=3)
-scrollbar.grid(row=13, column=4)
+lbl_filter.grid(row=13, column=1)
+ent_filter.grid(row=13, column=2)
+msg_list.grid(row=14, column=1, columnspan=3)
+scrollbar.grid(row=14, column=4, sticky='ns')
 
 #Debugging quick default values
 ent_IPAddress.insert(0, '127.0.0.1')
@@ -119,7 +212,8 @@ op.set(scheduler.valid_operations[0])
 pName1.set(scheduler.valid_names[0])
 pName2.set(scheduler.valid_names[0])
 
-#Starts GUI loop and constantly updates status and connection
-update_status()
-update_connection()
+#Starts GUI loop, status and connection labels change when the driver says so
+MockRobot_Driver.add_listener(notify)
 root.mainloop()
+driver_calls.shutdown(wait=False)
+MockRobot_Driver.close() #disconnects and writes out capture
@@ -0,0 +1,293 @@
+'''Python 3.9.4'''
+import sys
+import csv
+import json
+import time
+import itertools
+import argparse
+import logging
+import threading
+
+import scheduler
+import transport
+from driver_interface import DriverInterface, DEFERRED
+from mockrobot_API import mockrobot_API
+from simclock import make_clock
+from metrics import get_logger
+
+log = get_logger('mockrobot.batch')
+
+FINISHED = 'Finished Successfully'
+
+
+class BatchJob():
+    '''One row of a job file, turned into robot commands'''
+    def __init__(self, line, id, steps, error=None):
+        self.line = line #int: line of row in job file
+        self.id = id #string: id column of row, or its line number
+        self.steps = steps #list of lists of commands and locations, ie. [['pick', 2], ['place', 1]]
+        self.error = error #string: why row cannot run, None if it can
+
+
+def read_rows(path, format=None):
+    '''
+    Reads a job file one row at a time, never holding more than one row
+
+    Arguments:
+        path: string of job file, '-' for stdin
+        format: string 'csv' (with header row) or 'jsonl', default from file extension
+
+    Returns: generator of (line number, dict of row or None if unreadable)
+    '''
+    format = format or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+    f = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+    try:
+        if format == 'csv':
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for line, text in enumerate(f, 1):
+                text = text.strip()
+                if text == '' or text.startswith('#'):
+                    continue
+                try:
+                    row = json.loads(text)
+                except ValueError:
+                    row = None
+                yield line, row if isinstance(row, dict) else None
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def location(value):
+    #location column as the driver sends it, digits become int
+    value = str(value if value != None else '').strip()
+    return int(value) if value.isdigit() else value
+
+
+def row_steps(row):
+    '''
+    Turns operation, source and destination columns into commands the same way
+    ExecuteOperation does for the form
+
+    Returns: (list of steps, None) or (None, error string)
+    '''
+    operation = str(row.get('operation') or 'Transfer').strip().capitalize()
+    source = location(row.get('source'))
+    destination = location(row.get('destination'))
+    if operation not in scheduler.valid_operations:
+        return None, '<INPUT ERROR> Input valid operation'
+    elif operation == 'Pick':
+        if source == '' or destination != '':
+            return None, '<INPUT ERROR> Pick needs a source and no destination'
+        return [['pick', source]], None
+    elif operation == 'Place':
+        if destination == '' or source != '':
+            return None, '<INPUT ERROR> Place needs a destination and no source'
+        return [['place', destination]], None
+    elif source == '' or destination == '':
+        return None, '<INPUT ERROR> Input all location values for Transfer'
+    elif source == destination:
+        return None, '<INPUT ERROR> Cannot Transfer same location'
+    return [['pick', source], ['place', destination]], None
+
+
+def parse_jobs(rows, registry):
+    '''
+    Turns rows into jobs, checking operations and locations before anything is sent
+
+    Arguments:
+        rows: iterable of (line number, dict) from read_rows; a row has operation
+              (Pick, Place or Transfer, default Transfer), source and destination,
+              or in JSONL a steps list, ie. [['pick', 2], ['place', 1]]; id is optional
+        registry: scheduler.LocationRegistry of the deck
+
+    Returns: generator of BatchJob
+    '''
+    for line, row in rows:
+        if row == None:
+            yield BatchJob(line, str(line), None, '<INPUT ERROR> Unreadable row')
+            continue
+        id = str(row.get('id') or line)
+        if row.get('steps') != None:
+            steps, error = row['steps'], None
+            if not isinstance(steps, list) or not steps or \
+                    not all(isinstance(s, list) and len(s) == 2 and s[0] in ('pick', 'place') for s in steps):
+                steps, error = None, '<INPUT ERROR> steps must be a list of [pick or place, location]'
+        else:
+            steps, error = row_steps(row)
+        if error == None and not all(registry.is_valid(loc) for cmd, loc in steps):
+            steps, error = None, '<INPUT ERROR> Input valid location values'
+        yield BatchJob(line, id, steps, error)
+
+
+class BatchRunner():
+    '''
+    Feeds a stream of jobs to a driver with at most inFlight of them submitted but
+    not finished, writing each result as soon as the robot is done with it, so
+    memory use does not grow with the length of the job file
+    The driver checks each job against the deck and the jobs queued ahead of it
+    '''
+    def __init__(self, driver, output, inFlight=4, keepGoing=False):
+        '''
+        Arguments:
+            driver: connected DriverInterface
+            output: text file results are written to, one JSON line per job
+            inFlight: int of jobs queued on the driver at once, enough to keep the robot busy
+            keepGoing: boolean, True to carry on past rows that fail or are refused
+        '''
+        self.driver = driver
+        self.output = output
+        self.inFlight = inFlight
+        self.keepGoing = keepGoing
+        self.cond = threading.Condition()
+        self.in_flight = 0 #int: jobs submitted and not finished
+        self.counts = {'finished': 0, 'failed': 0, 'refused': 0, 'invalid': 0, 'deferred': 0}
+        self.last_line = 0 #int: line of latest row read from job file
+        self.stopped = None #string: why no more jobs are submitted
+        self.started = None #float: time.monotonic() run began
+        self.write_lock = threading.Lock()
+
+    def run(self, jobs):
+        '''
+        Submits jobs in order, waiting while inFlight are unfinished, then waits for the last ones
+
+        Arguments:
+            jobs: iterable of BatchJob, ie. from parse_jobs
+
+        Returns: dict of progress, see progress
+        '''
+        self.started = time.monotonic()
+        for batch_job in jobs:
+            self.last_line = batch_job.line
+            if batch_job.error != None:
+                self.write(batch_job, batch_job.error)
+                with self.cond:
+                    self.counts['invalid'] += 1
+                    if not self.keepGoing:
+                        self.stopped = f'line {batch_job.line}: {batch_job.error}'
+                        break
+                continue
+            with self.cond:
+                while self.in_flight >= self.inFlight and self.stopped == None:
+                    self.cond.wait()
+                if self.stopped != None:
+                    break
+                self.in_flight += 1
+            callback = lambda job, batch_job=batch_job: self.job_done(batch_job, job)
+            if len(batch_job.steps) == 1:
+                self.driver.submit_jobs(batch_job.steps, callback)
+            else:
+                self.driver.submit_program(batch_job.steps, callback)
+        with self.cond:
+            while self.in_flight > 0:
+                self.cond.wait()
+        return self.progress()
+
+    def job_done(self, batch_job, job):
+        #driver finished or refused a job, called on a driver thread
+        result = job.result()
+        self.write(batch_job, result, job)
+        with self.cond:
+            self.in_flight -= 1
+            if result == FINISHED:
+                self.counts['finished'] += 1
+            elif result == DEFERRED: #still journaled, runs on the next connection, do not run row again
+                self.counts['deferred'] += 1
+                if self.stopped == None:
+                    self.stopped = f'line {batch_job.line}: {result}'
+            else:
+                self.counts['refused' if result.startswith('<') else 'failed'] += 1
+                #without a connection nothing else can run, keepGoing or not
+                if self.stopped == None and (not self.keepGoing or result.startswith('<DRIVER ERROR>')):
+                    self.stopped = f'line {batch_job.line}: {result}'
+            self.cond.notify_all()
+
+    def write(self, batch_job, result, job=None):
+        #appends result of one row to output
+        record = {'line': batch_job.line, 'id': batch_job.id, 'steps': batch_job.steps, 'result': result}
+        if job != None:
+            record['dispatched'] = job.dispatched
+            record['finished'] = job.finished
+            if job.journal_id != None: #matches a deferred row to its result after resuming
+                record['journal'] = job.journal_id
+        with self.write_lock:
+            self.output.write(json.dumps(record) + '\n')
+            self.output.flush()
+
+    def progress(self):
+        '''
+        Gives how far the run is
+
+        Returns: dict of counts per outcome, jobs in flight, last line read,
+                 jobs per second and why it stopped early, if it did
+        '''
+        with self.cond:
+            done = sum(self.counts.values())
+            elapsed = time.monotonic() - self.started if self.started != None else 0.0
+            return dict(self.counts, done=done, in_flight=self.in_flight, last_line=self.last_line,
+                        elapsed=elapsed, jobs_per_s=done / elapsed if elapsed > 0 else None,
+                        stopped=self.stopped)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a CSV or JSONL job file on MockRobot without the UI')
+    parser.add_argument('jobs', help="job file, '-' for stdin; CSV columns id,operation,source,destination")
+    parser.add_argument('--format', choices=['csv', 'jsonl'], default=None, help='default from file extension')
+    parser.add_argument('--address', default='tcp://127.0.0.1:1000',
+                        help='robot address, ie. tcp://host:port or unix:///tmp/mockrobot.sock')
+    parser.add_argument('--simulate', action='store_true', help='run jobs on an in-process simulator instead')
+    parser.add_argument('--speedup', type=float, default=1,
+                        help='run simulated time this many times faster than real time')
+    parser.add_argument('--output', default='-', help="file results are appended to, one JSON line per job")
+    parser.add_argument('--in-flight', type=int, default=4, help='jobs queued on the driver at once')
+    parser.add_argument('--skip', type=int, default=0, help='rows to skip, ie. ones already run')
+    parser.add_argument('--keep-going', action='store_true', help='carry on past rows that fail or are refused')
+    parser.add_argument('--journal', default=None, help='driver journal to resume jobs after a crash')
+    parser.add_argument('--interval', type=float, default=10, help='seconds between progress lines on stderr')
+    args = parser.parse_args()
+    if not args.simulate: #without a scheme OpenConnection would take the address for an IP with no port
+        try:
+            transport.parse_address(args.address)
+        except ValueError as e:
+            parser.error(f'--address: {e}, ie. tcp://127.0.0.1:1000')
+
+    logging.basicConfig(level=logging.WARNING, format='%(message)s')
+
+    clock = make_clock(args.speedup)
+    address = args.address
+    if args.simulate: #robot keeps its own deck, as it would in its own process
+        robot = mockrobot_API(clock=clock, registry=scheduler.LocationRegistry())
+        threading.Thread(target=robot.start_server, args=('inproc://batch',), daemon=True).start()
+        robot.ready.wait(5)
+        address = robot.address
+    driver = DriverInterface(clock=clock, journal=args.journal)
+    connection_status = driver.OpenConnection(address, None)
+    print(connection_status, file=sys.stderr)
+    if not connection_status.startswith('<SUCCESS>'):
+        sys.exit(2)
+
+    output = sys.stdout if args.output == '-' else open(args.output, 'a', encoding='utf-8')
+    runner = BatchRunner(driver, output, args.in_flight, args.keep_going)
+    #jobs an earlier run wrote as deferred finish first, their results go out under the same journal id
+    for job in driver.resumed:
+        runner.write(BatchJob(None, None, driver.job_steps([job])), job.result(), job)
+    rows = itertools.islice(read_rows(args.jobs, args.format), args.skip, None)
+    finished = threading.Event()
+    def report():
+        while not finished.wait(args.interval):
+            print(json.dumps(runner.progress()), file=sys.stderr)
+    threading.Thread(target=report, daemon=True).start()
+    summary = runner.run(parse_jobs(rows, driver.registry))
+    finished.set()
+    driver.close()
+    print(json.dumps(summary), file=sys.stderr)
+    if output is not sys.stdout:
+        output.close()
+    sys.exit(1 if summary['stopped'] else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+'''Python 3.9.4'''
+import os
+import sys
+import time
+import json
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import scheduler
+from fleet import RobotFleet, FleetManager, POLICIES
+
+
+def shuttle_programs(transfers, chains):
+    '''
+    Plates shuttled back and forth between pairs of locations, plate i between
+    locations 2i+1 and 2i+2 (by index into valid_locations)
+
+    Returns: list of programs in the order they are submitted
+    '''
+    locs = scheduler.valid_locations
+    programs = []
+    for i in range(transfers):
+        chain = i % chains
+        a, b = locs[2 * chain], locs[2 * chain + 1]
+        src, dst = (a, b) if (i // chains) % 2 == 0 else (b, a)
+        programs.append([['pick', int(src)], ['place', int(dst)]])
+    return programs
+
+
+def run(robots, policy, programs, op_time, scheme):
+    #fleet of robots running programs, gives report of fleet manager
+    fleet = RobotFleet(robots, opDurations={'pick': op_time, 'place': op_time}, scheme=scheme,
+                       name=f'bench-{policy}-{robots}')
+    manager = FleetManager(fleet.start(), policy=policy)
+    manager.OpenConnections()
+    start = time.perf_counter()
+    manager.ExecuteQueue(programs)
+    wall = time.perf_counter() - start
+    report = manager.get_report()
+    manager.Abort()
+    fleet.stop()
+    report['wall'] = wall
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fleet throughput by robot count and dispatch policy')
+    parser.add_argument('--transfers', type=int, default=100)
+    parser.add_argument('--chains', type=int, default=5, help='plates shuttled in parallel')
+    parser.add_argument('--op-time', type=float, default=0.01, help='seconds per pick/place')
+    parser.add_argument('--robots', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--transport', default='inproc', choices=['inproc', 'unix', 'tcp'])
+    parser.add_argument('--json', action='store_true', help='print full reports as JSON')
+    args = parser.parse_args()
+
+    programs = shuttle_programs(args.transfers, args.chains)
+    reports = [run(n, policy, programs, args.op_time, args.transport) for policy in POLICIES for n in args.robots]
+    #a run that lost jobs did less work, its throughput is not comparable
+    incomplete = [r for r in reports if r['jobs_failed'] or r['jobs_refused']]
+    if args.json:
+        print(json.dumps(reports, indent=2))
+    else:
+        print(f'{args.transfers} transfers, {args.chains} plates, {args.op_time}s per move, over {args.transport}')
+        for report in reports:
+            print(f"{report['policy']:>12} x{report['robots']}: {report['jobs_completed']:4d} done "
+                  f"{report['jobs_failed']:4d} failed {report['jobs_refused']:4d} refused  "
+                  f"{report['throughput'] or 0:7.1f} transfers/s  "
+                  f"utilization {[round(r['utilization'] or 0, 2) for r in report['per_robot']]}"
+                  f"{'  INCOMPLETE, not comparable' if report in incomplete else ''}")
+    if incomplete:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
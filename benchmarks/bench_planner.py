@@ -0,0 +1,83 @@
+'''Python 3.9.4'''
+import os
+import sys
+import time
+import random
+import logging
+import argparse
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import scheduler
+from planner import TransferPlanner
+from driver_interface import DriverInterface
+from mockrobot_API import mockrobot_API
+from simclock import VirtualClock
+
+FINISHED = 'Finished Successfully'
+
+
+def random_batch(count, seed):
+    #transfers between random valid locations, always from a location holding a plate onto an empty one
+    rng = random.Random(seed)
+    full = set(rng.sample(scheduler.valid_locations, len(scheduler.valid_locations) // 2))
+    batch = []
+    while len(batch) < count:
+        src = rng.choice(sorted(full))
+        dst = rng.choice(sorted(set(scheduler.valid_locations) - full))
+        full.remove(src)
+        full.add(dst)
+        batch.append((src, dst))
+    return batch
+
+
+def simulate(planner, transfers, name):
+    '''
+    Runs transfers on an in-process simulator with arm travel and discrete-event time
+
+    Returns: (simulated seconds from first move to last, int of moves that did not finish)
+    '''
+    clock = VirtualClock()
+    robot = mockrobot_API(clock=clock, opDurations=planner.opDurations, registry=scheduler.LocationRegistry(),
+                          armSpeed=planner.armSpeed, coords=planner.coords)
+    threading.Thread(target=robot.start_server, args=(f'inproc://{name}',), daemon=True).start()
+    robot.ready.wait(5)
+    driver = DriverInterface(clock=clock, registry=scheduler.LocationRegistry())
+    driver.OpenConnection(robot.address, '')
+    start = clock.now()
+    results = driver.ExecuteQueue(planner.to_queue(transfers))
+    elapsed = clock.now() - start
+    driver.Abort()
+    robot.close()
+    return elapsed, sum(result != FINISHED for result in results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Entered order vs planned order for random transfer batches')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 5000])
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(message)s')
+
+    #makespan is measured on the simulator, whose moves include arm travel at the planner's speed
+    planner = TransferPlanner()
+    print(f'{"transfers":>9} {"plan ms":>8} {"travel":>10} {"planned":>10} {"makespan s":>11} {"planned s":>10} {"saved":>6}')
+    failed = False
+    for size in args.sizes:
+        batch = random_batch(size, args.seed)
+        start = time.perf_counter()
+        plan = planner.plan(batch)
+        elapsed = (time.perf_counter() - start) * 1000
+        before, before_failed = simulate(planner, batch, f'entered-{size}')
+        after, after_failed = simulate(planner, plan, f'planned-{size}')
+        failed = failed or before_failed or after_failed
+        print(f'{size:>9} {elapsed:>8.1f} {planner.travel(batch):>10.1f} {planner.travel(plan):>10.1f} '
+              f'{before:>11.1f} {after:>10.1f} {(before - after) / before:>6.1%}'
+              f'{"  INCOMPLETE, not comparable" if before_failed or after_failed else ""}')
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+'''Python 3.9.4'''
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from protocol import JsonCodec, BinaryCodec
+
+STATUS_DICT = {100: 'Idle', 101: 'In Progress', 102: 'Finished Successfully',
+               103: 'Terminated With Error', -300: 'Bad Request, In Progress'}
+
+#typical traffic of one driver, most of it status reads
+MESSAGES = {
+    'status request': {'command': 'getCurrentStatusID', 'param': None, 'id': 1234},
+    'status response': {'request_status': 200, 'data': 101, 'id': 1234},
+    'status event': {'request_status': 200, 'event': 'status', 'data': {'statusID': 102, 'status': 'Finished Successfully'}},
+    'pick request': {'command': 'pick', 'param': 38, 'id': 1235},
+    'error response': {'request_status': 400, 'data': 'Location 38 is empty', 'id': 1235},
+}
+
+
+def per_message_us(codec, msg_dict, count):
+    #microseconds to encode and decode one message
+    start = time.perf_counter()
+    for _ in range(count):
+        codec.decode(codec.encode(msg_dict))
+    return (time.perf_counter() - start) / count * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description='JSON vs binary wire format, CPU and bytes per message')
+    parser.add_argument('--count', type=int, default=100000)
+    args = parser.parse_args()
+
+    codecs = [JsonCodec(), BinaryCodec(STATUS_DICT)]
+    print(f'{"message":<16} {"json us":>8} {"binary us":>10} {"json B":>7} {"binary B":>9}')
+    for name, msg_dict in MESSAGES.items():
+        us = [per_message_us(codec, msg_dict, args.count) for codec in codecs]
+        size = [len(codec.encode(msg_dict)) + 4 for codec in codecs] #plus length header
+        print(f'{name:<16} {us[0]:>8.2f} {us[1]:>10.2f} {size[0]:>7} {size[1]:>9}')
+
+
+if __name__ == '__main__':
+    main()
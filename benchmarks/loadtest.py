@@ -0,0 +1,205 @@
+'''Python 3.9.4'''
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import tempfile
+import threading
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import scheduler
+from mockrobot_API import mockrobot_API
+from driver_interface import DriverInterface
+
+
+class TimedAPI(mockrobot_API):
+    '''Simulator that remembers when each status change happened'''
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.changed = {} #status ID -> perf_counter of latest change to it
+
+    def set_status(self, statusID, command=None):
+        self.changed[statusID] = time.perf_counter()
+        super().set_status(statusID, command)
+
+
+class TimedDriver(DriverInterface):
+    '''Driver that remembers when processStatus last took each value'''
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.seen = {} #process status -> perf_counter it was last applied
+
+    def set_processStatus(self, processStatus):
+        super().set_processStatus(processStatus)
+        self.seen[processStatus] = time.perf_counter()
+
+
+servers = itertools.count(1) #numbers unix socket files and in-process names apart
+
+
+def free_address(scheme):
+    #address nothing else is listening on, tcp port 0 binds to a free port
+    if scheme == 'unix':
+        return f'unix://{tempfile.gettempdir()}/mockrobot-loadtest-{os.getpid()}-{next(servers)}.sock'
+    elif scheme == 'inproc':
+        return f'inproc://loadtest-{next(servers)}'
+    return 'tcp://127.0.0.1:0'
+
+
+def start_api(use_async=False, opDurations=None, scheme='tcp'):
+    '''
+    Starts simulator on a free address in a background thread
+
+    Returns: (TimedAPI, transport address string)
+    '''
+    api = TimedAPI(opDurations=opDurations, registry=scheduler.LocationRegistry())
+    if use_async:
+        target = lambda: asyncio.run(api.start_async_server(free_address(scheme)))
+    else:
+        target = lambda: api.start_server(free_address(scheme))
+    threading.Thread(target=target, daemon=True).start()
+    api.ready.wait(5)
+    return api, api.address
+
+
+def connect(api, address, wireFormats, driver_class=DriverInterface, observer=False):
+    #driver sharing the simulator's registry, like a scheduler embedding both
+    driver = driver_class(registry=api.registry, wireFormats=wireFormats)
+    status = driver.OpenConnection(address, '', observer)
+    if not status.startswith('<SUCCESS>'):
+        raise RuntimeError(status)
+    return driver
+
+
+def summary(samples):
+    #exact percentiles of samples in seconds, given in milliseconds
+    ordered = sorted(samples)
+    pick = lambda p: ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] * 1000
+    return {'count': len(ordered), 'mean': sum(ordered) / len(ordered) * 1000,
+            'p50': pick(50), 'p90': pick(90), 'p99': pick(99), 'max': ordered[-1] * 1000}
+
+
+def bench_rtt(wireFormats, count, scheme='tcp'):
+    '''Round trip of one status read at a time, and of many pipelined reads'''
+    api, address = start_api(scheme=scheme)
+    driver = connect(api, address, wireFormats)
+    samples = []
+    for _ in range(count):
+        start = time.perf_counter()
+        driver.request_API('getCurrentStatusID')
+        samples.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    futures = [driver.submit_request('getCurrentStatusID') for _ in range(count)]
+    for future in futures:
+        future.result()
+    pipelined = count / (time.perf_counter() - start)
+    driver.Abort()
+    api.stop_server()
+    return {'transport': scheme, 'format': driver.codec.name, 'sequential_ms': summary(samples),
+            'pipelined_per_s': pipelined}
+
+
+def bench_status_latency(wireFormats, count):
+    '''Time from simulator changing status to driver's processStatus showing it'''
+    api, address = start_api(opDurations={'home': 0.002})
+    driver = connect(api, address, wireFormats, TimedDriver)
+    samples = []
+    for _ in range(count):
+        driver.ExecuteQueue([['home', None]])
+        samples.append(driver.seen['Finished Successfully'] - api.changed[102])
+    driver.Abort()
+    return {'format': driver.codec.name, 'latency_ms': summary(samples)}
+
+
+def bench_makespan(transfers, op_time):
+    '''Transfers back-to-back as separate jobs and as programs, against pure move time'''
+    api, address = start_api(opDurations={'pick': op_time, 'place': op_time})
+    driver = connect(api, address, ['binary', 'json'])
+    ideal = transfers * 2 * op_time
+    result = {'transfers': transfers, 'op_time_s': op_time, 'ideal_s': ideal}
+    for name in ('jobs', 'programs'):
+        start = time.perf_counter()
+        for i in range(transfers):
+            src, dst = ('1', '2') if i % 2 == 0 else ('2', '1')
+            if name == 'jobs':
+                jobs = driver.submit_jobs([['pick', src], ['place', dst]])
+            else:
+                jobs = [driver.submit_program([['pick', src], ['place', dst]])]
+        jobs[-1].result()
+        elapsed = time.perf_counter() - start
+        result[name] = {'makespan_s': elapsed, 'overhead_per_transfer_ms': (elapsed - ideal) / transfers * 1000}
+    driver.Abort()
+    return result
+
+
+def bench_idle_cpu(drivers, seconds):
+    '''Process CPU while drivers sit connected and idle, server and drivers in process'''
+    api, address = start_api(use_async=True)
+    connected = [connect(api, address, ['binary', 'json'], observer=i > 0) for i in range(drivers)]
+    start_cpu, start = time.process_time(), time.perf_counter()
+    time.sleep(seconds)
+    cpu = time.process_time() - start_cpu
+    wall = time.perf_counter() - start
+    for driver in connected:
+        driver.Abort()
+    return {'drivers': drivers, 'cpu_percent': cpu / wall * 100, 'cpu_percent_per_driver': cpu / wall * 100 / drivers}
+
+
+def bench_clients(clients, use_async):
+    '''Many clients asking for control at once: one is accepted, the rest refused'''
+    api, address = start_api(use_async=use_async)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=64) as pool:
+        drivers = list(pool.map(lambda _: DriverInterface(registry=api.registry), range(clients)))
+        statuses = list(pool.map(lambda d: d.OpenConnection(address, ''), drivers))
+    elapsed = time.perf_counter() - start
+    for driver in drivers:
+        if driver.connected:
+            driver.Abort()
+    return {
+        'server': 'async' if use_async else 'threaded',
+        'clients': clients,
+        'accepted': sum(s.startswith('<SUCCESS>') for s in statuses),
+        'refused': sum(s.startswith('<SERVER ERROR>') for s in statuses),
+        'failed': sum(s.startswith('<DRIVER ERROR>') for s in statuses),
+        'seconds': elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Headless load test of driver and simulator, results as JSON')
+    parser.add_argument('--requests', type=int, default=2000, help='status reads per RTT run')
+    parser.add_argument('--transitions', type=int, default=200, help='status changes timed')
+    parser.add_argument('--transfers', type=int, default=50)
+    parser.add_argument('--op-time', type=float, default=0.01, help='seconds per pick/place')
+    parser.add_argument('--idle-drivers', type=int, default=50)
+    parser.add_argument('--idle-seconds', type=float, default=2)
+    parser.add_argument('--clients', type=int, default=200, help='clients connecting at once')
+    parser.add_argument('--output', help='write JSON here instead of stdout')
+    args = parser.parse_args()
+
+    results = {
+        'environment': {'python': platform.python_version(), 'platform': platform.platform(),
+                        'cpus': os.cpu_count(), 'time': time.time()},
+        'rtt': [bench_rtt(f, args.requests) for f in (['json'], ['binary'])],
+        'transports': [bench_rtt(['binary', 'json'], args.requests, scheme) for scheme in ('tcp', 'unix', 'inproc')],
+        'status_latency': [bench_status_latency(f, args.transitions) for f in (['json'], ['binary'])],
+        'makespan': bench_makespan(args.transfers, args.op_time),
+        'idle_cpu': bench_idle_cpu(args.idle_drivers, args.idle_seconds),
+        'clients': [bench_clients(args.clients, use_async) for use_async in (False, True)],
+    }
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
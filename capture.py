@@ -0,0 +1,84 @@
+'''Python 3.9.4'''
+import time
+import struct
+import threading
+
+#file starts with MAGIC, then one RECORD header and payload per message
+MAGIC = b'MRWIRE1\n'
+RECORD = struct.Struct('!dBBII') #seconds since capture start, direction, codec, connection, payload length
+
+#direction of a message, whichever side recorded it
+TO_ROBOT = 0 #requests
+TO_DRIVER = 1 #responses and pushed events
+
+#wire format the payload is encoded in
+CODECS = ['json', 'binary']
+
+
+class WireRecorder():
+    '''
+    Appends every message a driver or robot sends or receives to a binary capture,
+    as the encoded bytes on the wire behind a small fixed header, for replay.py
+    '''
+    def __init__(self, path):
+        '''
+        Arguments:
+            path: string of capture file, overwritten
+        '''
+        self.path = path
+        self.file = open(path, 'wb', buffering=1 << 16)
+        self.file.write(MAGIC)
+        self.started = time.monotonic()
+        self.lock = threading.Lock()
+        self.count = 0 #int: messages recorded
+
+    def record(self, direction, conn, codec, payload):
+        '''
+        Adds one message
+
+        Arguments:
+            direction: TO_ROBOT or TO_DRIVER
+            conn: int of connection the message went over
+            codec: string of wire format of payload, 'json' or 'binary'
+            payload: bytes of encoded message
+        '''
+        header = RECORD.pack(time.monotonic() - self.started, direction, CODECS.index(codec), conn, len(payload))
+        with self.lock:
+            if self.file.closed:
+                return
+            self.file.write(header)
+            self.file.write(payload)
+            self.count += 1
+
+    def flush(self):
+        #writes out buffered messages, ie. when a session ends, so a crash later loses none of it
+        with self.lock:
+            if not self.file.closed:
+                self.file.flush()
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+def read_capture(path):
+    '''
+    Reads back a capture written by WireRecorder, stopping at a torn last record
+
+    Arguments:
+        path: string of capture file
+
+    Returns: generator of (seconds, direction, codec name, connection, payload bytes)
+    '''
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f'{path} is not a wire capture')
+        while True:
+            header = f.read(RECORD.size)
+            if len(header) < RECORD.size:
+                return
+            seconds, direction, codec, conn, size = RECORD.unpack(header)
+            payload = f.read(size)
+            if len(payload) < size:
+                return
+            yield seconds, direction, CODECS[codec], conn, payload
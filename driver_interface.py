@@ -1,118 +1,349 @@
 '''Python 3.9.4'''
-import socket
 import time
 import threading
-import json
+import itertools
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeout
 
 import scheduler
+import transport
+from journal import JobJournal
+from durations import DurationModel
+from capture import WireRecorder, TO_ROBOT, TO_DRIVER
+from protocol import JsonCodec, make_codec, WIRE_FORMATS
+from simclock import RealClock
+from metrics import Metrics, get_logger
+
+log = get_logger('mockrobot.driver')
+
+#result of a job cut off by a disconnect that stays in the journal, the next OpenConnection runs it
+DEFERRED = '<DRIVER ERROR> Deferred to journal'
+
+
+class Job(Future):
+    '''
+    Handle of one operation given to the dispatcher, resolves to the final
+    process status (or error string) once the robot is done with it
+    '''
+    def __init__(self, cmd, arg, submitted):
+        super().__init__()
+        self.cmd = cmd #string: command sent to robot
+        self.arg = arg #string or int: argument of command
+        self.submitted = submitted #float: clock time job was queued
+        self.dispatched = None #float: clock time command was sent
+        self.finished = None #float: clock time robot finished with it
+        self.progress = [] #list of step results pushed while a program runs
+        self.journal_id = None #int: id of job in the driver's journal, if it keeps one
 
 
 class DriverInterface():
-    def __init__(self):
-        self.BUFFER_SIZE = 1024
+    def __init__(self, clock=None, registry=None, wireFormats=WIRE_FORMATS, journal=None, durations=None,
+                 recorder=None, timeout=30):
+        '''
+        Arguments:
+            clock: RealClock, ScaledClock or VirtualClock matching the robot's
+            registry: scheduler.LocationRegistry of the deck, defaults to the shared one
+            wireFormats: list of wire formats to offer robot, most preferred first
+            journal: string of journal file path or JobJournal, to resume jobs after a crash or Abort
+            durations: dict of operation name -> seconds to assume until timed, or DurationModel
+            recorder: string of capture file path or WireRecorder, to record every message for replay.py
+            timeout: float of wall seconds to wait for a connection or a response, None to wait for ever
+        '''
         self.FORMAT = 'utf-8'
 
-        self.driver = None #class: socket
+        self.driver = None #transport connection to robot: TCP, unix socket or in-process
         self.processStatus = None #string: current robot process status
+        self.status_events = 0 #int: status events received, a status asked for before the latest one is stale
         self.connected = False #boolean: connection to robot
-
-    def OpenConnection(self, IPAddress, Port):
+        self.observer = False #boolean: read-only connection that cannot move robot
+        self.pending = {} #dict: request id -> Future waiting on that response
+        self.pending_lock = threading.Lock()
+        self.send_lock = threading.Lock() #keeps concurrent requests from interleaving bytes
+        self.request_ids = itertools.count(1)
+        self.clock = clock or RealClock() #job timestamps run on robot's time
+        self.jobs = deque() #Jobs waiting for the dispatcher
+        self.job_cond = threading.Condition() #wakes dispatcher on new jobs and status changes
+        self.active_job = None #Job the robot is working on
+        self.registry = registry or scheduler.registry #checks batches before dispatch
+        self.wireFormats = list(wireFormats)
+        self.codec = JsonCodec() #wire format agreed with robot in hello
+        self.metrics = Metrics() #counters and latency histograms, see get_metrics
+        self.last_finished = None #float: clock time robot finished the last job
+        self.journal = JobJournal(journal) if isinstance(journal, str) else journal
+        self.resumed = [] #Jobs picked up from the journal on the last OpenConnection
+        self.history_seq = None #int: last robot status transition seen, see get_history
+        #learned operation timings for eta and for waking once a move is overdue
+        self.durations = durations if isinstance(durations, DurationModel) else DurationModel(durations)
+        self.recorder = WireRecorder(recorder) if isinstance(recorder, str) else recorder
+        self.connection_id = 0 #int: number of OpenConnection calls, for captures
+        self.listeners = [] #functions called on process status and connection changes, see add_listener
+        self.timeout = timeout #float: wall seconds connecting or a request may take
+
+    def OpenConnection(self, IPAddress, Port, observer=False):
         '''
-        Begins connection with robot and starts thread to constantly update process status
+        Begins connection with robot, starts thread to receive responses and
+        subscribes to process status events
 
         Arguments:
-            IPAddress: string representing IP
-            Port: string representing port number
+            IPAddress: string representing IP, or whole transport address
+                       ie. 'unix:///tmp/mockrobot.sock' or 'inproc://robot'
+            Port: string representing port number, ignored for a whole transport address
+            observer: boolean, True to only watch status while another driver controls robot
 
         Returns: string documenting success or error that occurred
         '''
         if self.connected:
             return '<DRIVER ERROR> MockRobot already connected'
-        if not Port.isdigit():
+        if '://' in IPAddress:
+            address = IPAddress
+        elif Port == None or not str(Port).isdigit():
             return '<INPUT ERROR> Input valid port number'
+        else:
+            address = f'tcp://{IPAddress}:{Port}'
 
         try:
-            Port = int(Port)
-            self.driver = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.driver.connect((IPAddress, Port))
-            
+            #greeting and hello are bounded too, then receive thread waits for ever
+            self.driver = transport.connect(address, self.timeout)
+            self.connection_id += 1
+
             #get the first msg if connection went through
-            conn_status = self.driver.recv(self.BUFFER_SIZE).decode(self.FORMAT)
-            #only officially connect if there is no existing connection
-            if conn_status == 'EXISTING_CONN':
+            conn_status = self.driver.recv().decode(self.FORMAT)
+            #only officially connect as controller if there is no existing connection
+            if conn_status == 'EXISTING_CONN' or (conn_status == 'OBSERVER' and not observer):
+                self.driver.close()
                 return '<SERVER ERROR> More than one client attempting to connect'
             else:
-                self.connected = True
-                #begin thread to constantly update process status
-                get_processStatus_thread = threading.Thread(target=self.get_processStatus)
-                get_processStatus_thread.start()
+                self.negotiate_format()
+                self.driver.settimeout(None)
+                self.set_connected(True)
+                self.observer = observer
+                #begin thread to receive responses and pushed status events
+                receive_thread = threading.Thread(target=self.receive_API, daemon=True)
+                receive_thread.start()
+                if observer and conn_status == 'WELCOME': #leave control to another driver
+                    self.request_API('observe')
+                self.get_processStatus()
+                if not observer: #begin thread to send queued jobs one at a time
+                    self.resume_jobs()
+                    dispatch_thread = threading.Thread(target=self.dispatch_jobs, daemon=True)
+                    dispatch_thread.start()
+                if observer:
+                    return '<SUCCESS> Observing MockRobot!'
+                elif self.resumed:
+                    return f'<SUCCESS> Connected to MockRobot! Resuming {len(self.resumed)} journaled jobs'
                 return '<SUCCESS> Connected to MockRobot!'
         except: #return this if connecting/recieving did not work
             return '<DRIVER ERROR> Connection failed...'
 
+    def negotiate_format(self):
+        '''
+        Agrees on wire format with robot before any other request, so nothing
+        is in flight while both sides switch; robots without hello stay on JSON
+        '''
+        self.codec = JsonCodec()
+        if self.wireFormats == ['json']:
+            return
+        self.send_payload(self.pack_request('hello', {'formats': self.wireFormats}))
+        msg = self.driver.recv()
+        if self.recorder != None:
+            self.recorder.record(TO_DRIVER, self.connection_id, self.codec.name, msg)
+        response = self.codec.decode(msg)
+        if response['request_status'] == 200:
+            self.codec = make_codec(response['data']['format'], response['data']['statusDict'])
+
     def get_processStatus(self):
         '''
-        Constantly updates process status by getting status ID and getting string from ID
+        Subscribes to process status events so robot pushes every status change,
+        and sets the current process status from the subscription response,
+        unless a status event came in while it was on its way
+        '''
+        with self.job_cond:
+            asked = self.status_events
+        status_data = self.request_API('subscribe')
+        if isinstance(status_data, dict):
+            self.set_processStatus(status_data['status'], asked)
+            if self.history_seq == None: #on reconnect, keep catching up from where we were
+                self.history_seq = status_data.get('seq', 0)
+
+    def set_processStatus(self, processStatus, asked=None):
+        #updates process status and wakes dispatcher waiting on it
+        #asked: status_events count when status was requested, it is dropped if an event came after
+        with self.job_cond:
+            if asked != None and asked != self.status_events:
+                return
+            changed = processStatus != self.processStatus
+            self.processStatus = processStatus
+            self.job_cond.notify_all()
+        if changed:
+            self.publish('processStatus', processStatus)
+
+    def set_connected(self, connected):
+        #updates connection state and tells listeners if it changed
+        changed = connected != self.connected
+        self.connected = connected
+        if changed:
+            self.publish('connected', connected)
+
+    def add_listener(self, callback):
+        '''
+        Registers a function to be told about process status and connection changes
+        instead of polling processStatus and connected
+        It is called on whichever driver thread made the change, so it should only
+        hand the change over, ie. put it on a queue.Queue
+
+        Arguments:
+            callback: function called with (name, value), name is 'processStatus' or 'connected'
+        '''
+        self.listeners.append(callback)
+
+    def publish(self, name, value):
+        #calls listeners with a state change, never while holding job_cond
+        for callback in self.listeners:
+            try:
+                callback(name, value)
+            except Exception:
+                log.exception('LISTENER: %s failed on %s change', callback, name)
+
+    def receive_API(self):
+        '''
+        Constantly reads from robot and routes messages while connected
+        Pushed status events update process status, everything else is a
+        response handed to the request waiting on its id
+        '''
+        while self.connected:
+            try:
+                msg = self.driver.recv()
+            except (OSError, ValueError): #connection closed under us
+                break
+            if msg == None: #robot closed connection
+                break
+            if self.recorder != None:
+                self.recorder.record(TO_DRIVER, self.connection_id, self.codec.name, msg)
+            py_dict = self.codec.decode(msg)
+            if py_dict.get('event') == 'status':
+                self.metrics.count('status_events')
+                with self.job_cond: #any status requested before now is older than this
+                    self.status_events += 1
+                self.set_processStatus(py_dict['data']['status'])
+                continue
+            elif py_dict.get('event') == 'progress': #a program step ended
+                self.metrics.count('progress_events')
+                job = self.active_job
+                if job != None:
+                    py_dict['data']['received'] = self.clock.now() #times each program step
+                    job.progress.append(py_dict['data'])
+                    if self.journal != None and job.journal_id != None:
+                        self.journal.append({'op': 'step', 'job': job.journal_id,
+                                             'step': py_dict['data']['step'], 'statusID': py_dict['data']['statusID']})
+                continue
+            with self.pending_lock:
+                future = self.pending.pop(py_dict.get('id'), None)
+            if future != None:
+                self.metrics.observe('request_rtt', time.perf_counter() - future.sent)
+                future.set_result(py_dict)
+        if self.connected: #lost connection without Abort
+            self.set_connected(False)
+            self.set_processStatus('Unknown')
+        #release requests that are still waiting on a response
+        with self.pending_lock:
+            waiting, self.pending = self.pending, {}
+        for future in waiting.values():
+            future.set_result({'request_status': 400, 'data': 'CONNECTION LOST'})
+        if self.recorder != None: #session is complete in the capture
+            self.recorder.flush()
+
+    def submit_request(self, cmd, arg=None, job=None):
+        '''
+        Sends request to robot API without waiting for the response,
+        so several requests can be in flight on one connection
+
+        Arguments:
+            cmd: string representing command to be sent
+            arg: string or int representing arguments of command
+            job: int journal id robot remembers a move by, see lastRun
+
+        Returns: Future resolving to the response dict once it arrives
         '''
-        check_processID = self.request_API('getCurrentStatusID')
-        prev_processID = None
-        while self.connected: #while connected to robot, check ID
-            check_processID = self.request_API('getCurrentStatusID')
-            #only send request to understand what ID means if it changes
-            if check_processID != prev_processID:
-                self.processStatus = self.request_API('status', check_processID)
-            prev_processID = check_processID
-            time.sleep(0.01) #do this every 0.01 seconds
+        future = Future()
+        future.sent = time.perf_counter()
+        self.metrics.count('requests')
+        request_id = next(self.request_ids)
+        future.request_id = request_id
+        with self.pending_lock:
+            self.pending[request_id] = future
+        #encode command in agreed wire format and send it
+        msg = self.pack_request(cmd, arg, request_id, job)
+        try:
+            with self.send_lock:
+                self.send_payload(msg)
+        except OSError: #connection closed before request went out
+            with self.pending_lock:
+                self.pending.pop(request_id, None)
+            future.set_result({'request_status': 400, 'data': 'CONNECTION LOST'})
+        return future
+
+    def send_payload(self, msg):
+        #sends encoded message to robot, recording it if capturing
+        if self.recorder != None:
+            self.recorder.record(TO_ROBOT, self.connection_id, self.codec.name, msg)
+        self.driver.send(msg)
 
-    def request_API(self, cmd, arg=None):
+    def request_API(self, cmd, arg=None, job=None):
         '''
         Sends request to robot API and returns response
         
         Arguments:
             cmd: string representing command to be sent
             arg: string or int representing arguments of command
+            job: int journal id robot remembers a move by, see lastRun
 
         Returns: string or int of the command's return robot-side,
                  or string documenting error
         '''
-        #encode command so sendable through TCP/IP and send it
-        msg = self.pack_request(cmd, arg)  
-        self.driver.send(msg)
-        #recieve response and decode it
-        raw_response = self.driver.recv(self.BUFFER_SIZE)
-        response = self.unpack_response(raw_response)
-        #print(msg, response) #for debugging
+        #wait for receive thread to hand over the response and decode it
+        future = self.submit_request(cmd, arg, job)
+        try:
+            response = self.unpack_response(future.result(self.timeout))
+        except FutureTimeout: #robot unreachable or hung, stop waiting on it
+            with self.pending_lock:
+                self.pending.pop(future.request_id, None)
+            self.metrics.count('request_timeouts')
+            log.warning('TIMEOUT: no response to %s within %s seconds', cmd, self.timeout)
+            response = self.unpack_response({'request_status': 400, 'data': 'NO RESPONSE'})
+        #print(cmd, arg, response) #for debugging
         return response
 
-    def pack_request(self, cmd, arg=None):
+    def pack_request(self, cmd, arg=None, request_id=None, job=None):
         '''
-        Converts command and arg into JSON format
-        ie. {'command': cmd, 'param': arg}
+        Converts command and arg into message in the agreed wire format
+        ie. {'command': cmd, 'param': arg, 'id': request_id}
 
         Arguments:
             cmd: string representing command to be sent
             arg: string or int representing arguments of command
+            request_id: int the response will be tagged with
+            job: int journal id robot remembers a move by, left out if None
         
-        Return: message encoded by format(utf-8) to send through TCP/IP
+        Return: bytes of message, the transport frames it if needed
         '''
         #python dictionary representation of JSON
-        d = {'command': cmd, 'param': arg} 
-        #converts dictionary to JSON string and encodes
-        msg = json.dumps(d).encode(self.FORMAT) 
+        d = {'command': cmd, 'param': arg, 'id': request_id} 
+        if job != None:
+            d['job'] = job
+        #encodes dictionary
+        msg = self.codec.encode(d)
         return msg
 
-    def unpack_response(self, raw_msg):
+    def unpack_response(self, py_dict):
         '''
-        Converts raw message in JSON to python dictionary and gives
-        content of the message
+        Gives content of a response already decoded by receive_API
         ie. {'request_status': 200, 'data': your data}
 
         Arguments:
-            raw_msg: bytes encoded by server
+            py_dict: python dict of the response sent by server
 
         Return: string or int of the data OR string documenting error
         '''
-        py_dict = json.loads(raw_msg) #convert JSON to python dict
         data = py_dict['data']
         #check if API request was recognized
         if py_dict['request_status'] == 200: #success
@@ -128,12 +359,13 @@ class DriverInterface():
         '''
         if not self.connected:
             return '<DRIVER ERROR> No connection available'
+        elif self.observer:
+            return '<DRIVER ERROR> Observer connection cannot move MockRobot'
         elif self.processStatus == 'In Progress':
             return '<DRIVER ERROR> Process already in progress'
 
         #sends home command
-        home_thread = threading.Thread(target=self.ExecuteQueue, args=([['home', None]],))
-        home_thread.start()
+        self.submit_jobs([['home', None]])
         return '<SUCCESS> Homing process initiated'
 
     def ExecuteOperation(self, operation, parameterNames, parameterValues):
@@ -149,6 +381,8 @@ class DriverInterface():
         '''
         if not self.connected:
             return '<DRIVER ERROR> No connection available'
+        elif self.observer:
+            return '<DRIVER ERROR> Observer connection cannot move MockRobot'
         elif self.processStatus == 'In Progress':
             return '<DRIVER ERROR> Process already in progress'
 
@@ -158,7 +392,7 @@ class DriverInterface():
         pValue2 = int(parameterValues[1]) if parameterValues[1] != '' and parameterValues[1].isdigit() else parameterValues[1]
 
         #check valid values from "scheduler program"
-        if scheduler.check_valid_locs(parameterValues) != True:
+        if not all(self.registry.is_valid(v) for v in parameterValues if v != ''):
             return '<INPUT ERROR> Input valid location values'
         #if pick or place
         elif operation == 'Pick' or operation == 'Place':
@@ -184,9 +418,7 @@ class DriverInterface():
             return '<INPUT ERROR> Select Source Location for Picking'
         elif pName2 == 'None' and pValue2 == '':
             #send pick command
-            pick_thread = threading.Thread(target=self.ExecuteQueue, args=([['pick', pValue1]],))
-            pick_thread.start()
-            return '<SUCCESS> Picking process initiated'
+            return self.job_started(self.submit_jobs([['pick', pValue1]])[0], '<SUCCESS> Picking process initiated')
 
     def handle_Place(self, pName1, pName2, pValue1, pValue2):
         #helper function for placing, returns string of success or error
@@ -194,9 +426,7 @@ class DriverInterface():
             return '<INPUT ERROR> Select Destination Location for Placing'
         elif pName2 == 'None' and pValue2 == '':
             #send place command
-            place_thread = threading.Thread(target=self.ExecuteQueue, args=([['place', pValue1]],))
-            place_thread.start()
-            return '<SUCCESS> Placing process initiated'
+            return self.job_started(self.submit_jobs([['place', pValue1]])[0], '<SUCCESS> Placing process initiated')
     
     def handle_Transfer(self, pName1, pName2, pValue1, pValue2, parameterNames, parameterValues):
         #helper function for transfer, returns string of success or error
@@ -210,31 +440,358 @@ class DriverInterface():
             #finds indeces of names so that pick goes first always
             i_src = parameterNames.index('Source Location')
             i_dst = parameterNames.index('Destination Location')
-            #send pick, then place command as queue
-            transfer_thread = threading.Thread(
-                target=self.ExecuteQueue, 
-                args=([['pick', int(parameterValues[i_src])], ['place', int(parameterValues[i_dst])]],))
-            transfer_thread.start()
-            return '<SUCCESS> Transfer process initiated'
+            #send pick, then place command as one program so robot runs them back-to-back
+            job = self.submit_program([['pick', int(parameterValues[i_src])], ['place', int(parameterValues[i_dst])]])
+            return self.job_started(job, '<SUCCESS> Transfer process initiated')
+
+    def job_started(self, job, success):
+        #gives success string, or error if job was refused before dispatch
+        if job.done() and job.result().startswith('<'):
+            return job.result()
+        return success
 
     def ExecuteQueue(self, queue):
         '''
-        Tells robot to perform operation from queue one at a time
+        Tells robot to perform operation from queue one at a time and waits for all of them
         *implemented so longer queues could be executed from a scheduler program, etc*
 
         Arguments:
             queue: list of lists containing series of commands to be sent to robot
             ie. [['pick', '2'], ['place', '1']]
+
+        Returns: list of final process status or error string per command
+        '''
+        return [job.result() for job in self.submit_jobs(queue)]
+
+    def submit_jobs(self, queue, callback=None):
+        '''
+        Adds commands to the dispatcher queue without waiting for them
+
+        Arguments:
+            queue: list of lists containing series of commands to be sent to robot
+            ie. [['pick', '2'], ['place', '1']]
+            callback: function called with each Job once robot is done with it
+
+        Returns: list of Jobs in the same order as queue
+        '''
+        now = self.clock.now()
+        jobs = [Job(cmd, arg, now) for cmd, arg in queue]
+        if callback != None:
+            for job in jobs:
+                job.add_done_callback(callback)
+        with self.job_cond:
+            if self.connected and not self.observer:
+                #refuse whole batch if any move is impossible after the jobs ahead of it
+                error = self.registry.validate(self.job_steps(jobs), self.pending_steps())
+                if error == None:
+                    self.metrics.count('jobs_submitted', len(jobs))
+                    if self.journal != None: #dispatch waits until these are on disk too
+                        for job in jobs:
+                            job.journal_id = self.journal.new_id()
+                            self.journal.append({'op': 'submit', 'job': job.journal_id, 'cmd': job.cmd, 'arg': job.arg})
+                    self.jobs.extend(jobs)
+                    self.job_cond.notify_all()
+                else:
+                    error = f'<INPUT ERROR> {error}'
+            else:
+                error = '<DRIVER ERROR> No connection available'
+        if error == None:
+            if self.journal != None: #one fsync for the whole batch, outside the lock
+                self.journal.sync()
+            return jobs
+        self.metrics.count('jobs_refused', len(jobs))
+        for job in jobs:
+            job.set_result(error)
+        return jobs
+
+    def validate(self, queue):
+        '''
+        Checks commands against the deck as it will be once every job already
+        submitted has run, without submitting them
+
+        Arguments:
+            queue: list of lists containing series of commands, ie. [['pick', 2], ['place', 1]]
+
+        Returns: string describing the first impossible command, or None if all are possible
         '''
-        #while queue is not empty and still connected to robot
-        while queue != [] and self.connected:
-            time.sleep(0.05)
-            #check if robot is doing anything
-            if self.processStatus != 'In Progress':
-                #only send command if not doing anything and remove from queue
-                print(queue[0])
-                self.request_API(queue[0][0], queue[0][1])
-                queue.pop(0)
+        with self.job_cond:
+            return self.registry.validate(queue, self.pending_steps())
+
+    def pending_steps(self):
+        #commands of the active job and every queued one, caller holds job_cond
+        ahead = [self.active_job] if self.active_job != None else []
+        return self.job_steps(ahead + list(self.jobs))
+
+    def job_steps(self, jobs):
+        #flattens jobs and their programs into single commands
+        steps = []
+        for job in jobs:
+            if job.cmd == 'program':
+                steps.extend(job.arg)
+            else:
+                steps.append([job.cmd, job.arg])
+        return steps
+
+    def submit_program(self, steps, callback=None):
+        '''
+        Adds a program the robot runs back-to-back in one request to the dispatcher queue
+
+        Arguments:
+            steps: list of lists containing series of commands to be run by robot
+            ie. [['pick', 2], ['place', 1]]
+            callback: function called with the Job once robot is done with it
+
+        Returns: Job whose progress lists each finished step
+        '''
+        return self.submit_jobs([['program', steps]], callback)[0]
+
+    def dispatch_jobs(self):
+        '''
+        Sends queued jobs to robot one at a time while connected, waking on
+        new jobs and status changes instead of polling
+        '''
+        while True:
+            with self.job_cond:
+                #wait until there is a job and robot is not doing anything
+                while self.connected and (not self.jobs or self.processStatus == 'In Progress'):
+                    self.job_cond.wait()
+                if not self.connected:
+                    break
+                job = self.jobs.popleft()
+                self.active_job = job #in the same step, so submit_jobs always validates after it
+            job.dispatched = self.clock.now()
+            self.metrics.observe('queue_wait', job.dispatched - job.submitted)
+            if self.last_finished != None: #robot sat idle although job was waiting
+                self.metrics.observe('dispatch_gap', job.dispatched - max(self.last_finished, job.submitted))
+            log.info('DISPATCHING: %s', [job.cmd, job.arg])
+            if self.journal != None and job.journal_id != None: #on disk before robot moves
+                self.journal.append({'op': 'dispatch', 'job': job.journal_id}, sync=True)
+            response = self.request_API(job.cmd, job.arg, job.journal_id)
+            if isinstance(response, str): #robot refused command, ie. bad request
+                processStatus = response
+            else:
+                #robot pushed In Progress before responding, wait for it to finish
+                processStatus = self.wait_finished(job)
+            job.finished = self.last_finished = self.clock.now()
+            self.metrics.observe(f'operation.{job.cmd}', job.finished - job.dispatched)
+            self.metrics.count('jobs_completed' if processStatus == 'Finished Successfully' else 'jobs_failed')
+            #keep registry in step with robot, harmless if robot already updated a shared one
+            if processStatus == 'Finished Successfully':
+                done = self.job_steps([job])
+            else:
+                done = [[p['command'], p['param']] for p in job.progress if p['statusID'] == 102]
+            for cmd, loc in done:
+                self.registry.complete(cmd, loc)
+            self.observe_durations(job, processStatus)
+            #a job cut off with the connection stays open in the journal to be resumed
+            if self.journal != None and job.journal_id != None:
+                if self.connected or processStatus == 'Finished Successfully':
+                    self.journal.append({'op': 'done', 'job': job.journal_id, 'result': processStatus})
+                else:
+                    processStatus = DEFERRED
+            self.active_job = None
+            job.set_result(processStatus)
+        #connection closed, nothing left will run now; journaled jobs run on the next OpenConnection
+        with self.job_cond:
+            left = list(self.jobs)
+            self.jobs.clear()
+        for job in left:
+            job.set_result(DEFERRED if job.journal_id != None else '<DRIVER ERROR> No connection available')
+
+    def wait_finished(self, job):
+        '''
+        Waits for the robot to push the end of the job's move; if the push is late
+        by more than the learned spread, asks robot for its status once in case the
+        event was lost, then waits twice as long before asking again
+
+        Returns: string of process status the job ended with
+        '''
+        check = 0 #int: status checks made for this job
+        while True:
+            with self.job_cond:
+                if not (self.connected and self.processStatus == 'In Progress'):
+                    return self.processStatus
+                timeout = self.overdue_timeout(job, check)
+                if self.job_cond.wait(timeout) or timeout == None:
+                    continue
+            self.metrics.count('status_checks')
+            check += 1
+            self.get_processStatus() #outside job_cond, receive thread needs it to deliver
+
+    def overdue_timeout(self, job, check):
+        #wall seconds until job is overdue, None to wait for the push alone
+        eta = self.active_finish(job)
+        if eta == None:
+            return None
+        steps = self.job_steps([job])
+        spread = sum((self.durations.estimate(cmd, loc) or (0.0, 0.0))[1] for cmd, loc in steps)
+        margin = max(3 * spread, 0.1 * (self.durations.estimate_steps(steps) or 0.0))
+        wait = self.clock.wall_seconds(max(eta + margin - self.clock.now(), 0.0) * 2 ** check)
+        return None if wait == None else max(wait, 0.01)
+
+    def observe_durations(self, job, processStatus):
+        #adds timings of a finished job's moves, each program step timed by its progress event
+        if job.cmd != 'program':
+            if processStatus == 'Finished Successfully':
+                self.durations.observe(job.cmd, job.arg, job.finished - job.dispatched)
+            return
+        started = job.dispatched
+        for p in job.progress:
+            if p['statusID'] == 102:
+                if 'started' in p and 'finished' in p: #robot's own timing, not when the event happened to be read
+                    seconds = p['finished'] - p['started']
+                else:
+                    seconds = p['received'] - started
+                self.durations.observe(p['command'], p['param'], seconds)
+            #robot's clock may be offset from ours, only its differences are used
+            started = p['received']
+
+    def estimate(self, queue):
+        '''
+        Predicts how long commands would take back-to-back, without running them
+        ie. to compare plans before submitting one
+
+        Arguments:
+            queue: list of lists containing series of commands, ie. [['pick', 2], ['place', 1]]
+
+        Returns: float of clock seconds, or None if any command was never timed
+        '''
+        return self.durations.estimate_steps(self.job_steps([Job(cmd, arg, None) for cmd, arg in queue]))
+
+    def active_finish(self, job):
+        #predicted clock time job the robot is working on finishes, from its steps left
+        steps = self.job_steps([job])
+        finished = [p for p in job.progress if p['statusID'] == 102]
+        started = finished[-1]['received'] if finished else job.dispatched #on our clock, not the robot's
+        remaining = self.durations.estimate_steps(steps[len(finished):])
+        if remaining == None or started == None:
+            return None
+        return max(started + remaining, self.clock.now())
+
+    def eta(self, job):
+        '''
+        Predicts when a job will be finished, counting the active job and every
+        job queued ahead of it
+
+        Arguments:
+            job: Job from submit_jobs or submit_program
+
+        Returns: float of clock time, or None if job is unknown or some
+                 command ahead of it was never timed
+        '''
+        if job.done():
+            return job.finished
+        with self.job_cond:
+            active = self.active_job
+            queued = list(self.jobs)
+        if job is active:
+            return self.active_finish(job)
+        elif not any(job is j for j in queued):
+            return None
+        finish = self.active_finish(active) if active != None else self.clock.now()
+        for j in queued:
+            seconds = self.durations.estimate_steps(self.job_steps([j]))
+            if finish == None or seconds == None:
+                return None
+            finish += seconds
+            if j is job:
+                return finish
+
+    def queue_eta(self):
+        '''
+        Predicts when everything submitted so far will be finished
+
+        Returns: float of clock time, or None if some command queued was never timed
+        '''
+        with self.job_cond:
+            active = self.active_job
+            last = self.jobs[-1] if self.jobs else None
+        if last != None:
+            return self.eta(last)
+        elif active != None:
+            return self.active_finish(active)
+        return self.clock.now()
+
+    def resume_jobs(self):
+        '''
+        Queues journaled jobs a crash or Abort left unfinished, ahead of anything new
+        The robot's lastRun says exactly how many steps of the job it was running
+        got done, so a half-finished program continues from the step it stopped at
+        '''
+        self.resumed = []
+        if self.journal == None:
+            return
+        unfinished = self.journal.unfinished()
+        if not unfinished:
+            return
+        with self.job_cond: #robot still finishing the move, wait for its outcome
+            while self.connected and self.processStatus == 'In Progress':
+                self.job_cond.wait()
+        last = self.request_API('lastRun')
+        if not isinstance(last, dict): #robot restarted or does not keep lastRun
+            last = None
+        jobs = []
+        for state in unfinished:
+            steps = state.steps()
+            completed = state.completed
+            if state.dispatched and last != None and last['job'] == state.job:
+                completed = last['completed'] #robot knows better than the batched journal
+            for cmd, loc in steps[:completed]:
+                self.registry.complete(cmd, loc)
+            if completed >= len(steps):
+                log.info('JOURNAL: job %s finished before reconnect', state.job)
+                self.journal.append({'op': 'done', 'job': state.job, 'result': 'Finished Successfully'})
+                continue
+            remaining = steps[completed:]
+            cmd, arg = ('program', remaining) if state.cmd == 'program' else remaining[0]
+            if completed > 0 or (cmd, arg) != (state.cmd, state.arg):
+                self.journal.append({'op': 'resume', 'job': state.job, 'cmd': cmd, 'arg': arg})
+            log.info('JOURNAL: resuming job %s from step %s: %s', state.job, completed, [cmd, arg])
+            job = Job(cmd, arg, self.clock.now())
+            job.journal_id = state.job
+            jobs.append(job)
+        self.journal.sync()
+        with self.job_cond:
+            self.jobs.extendleft(reversed(jobs))
+            self.job_cond.notify_all()
+        self.metrics.count('jobs_resumed', len(jobs))
+        self.resumed = jobs
+
+    def clear_journal(self):
+        #gives up on every unfinished journaled job, so none is resumed on the next OpenConnection
+        if self.journal == None:
+            return
+        for state in self.journal.unfinished():
+            self.journal.append({'op': 'done', 'job': state.job, 'result': 'Cancelled'})
+        self.journal.sync()
+
+    def get_history(self):
+        '''
+        Fetches every status transition robot recorded since the last call (or the
+        first subscribe) in one request, ie. to catch up after a stall or reconnect
+
+        Returns: list of [seq, clock time, statusID, command], or string documenting error
+        '''
+        if not self.connected:
+            return '<DRIVER ERROR> No connection available'
+        data = self.request_API('history', self.history_seq or 0)
+        if isinstance(data, str): #error, or robot without history
+            return data
+        if data['missed']:
+            log.warning('HISTORY: %s status transitions overwritten before they were read', data['missed'])
+        if data['reset']:
+            log.warning('HISTORY: robot restarted, history starts over')
+        self.history_seq = data['seq']
+        return data['transitions']
+
+    def get_metrics(self):
+        '''
+        Gives counters and latency histograms of this driver
+        ie. request_rtt, queue_wait, dispatch_gap, operation.<command>, status_events
+
+        Returns: dict with uptime, counters, rates per second and histograms in seconds
+        '''
+        return self.metrics.snapshot()
 
     def Abort(self):
         '''
@@ -246,7 +803,20 @@ class DriverInterface():
             return '<DRIVER ERROR> No connection available'
 
         self.request_API('disconnect')
-        self.driver.close()
-        self.connected = False
-        self.processStatus = 'Unknown'
+        self.set_connected(False)
+        self.driver.close() #also wakes up receive thread blocked on it
+        self.set_processStatus('Unknown') #also wakes dispatcher so it stops
+        if self.recorder != None:
+            self.recorder.flush()
         return '<SUCCESS> Disconnected from MockRobot!'
+
+    def close(self):
+        '''
+        Disconnects if connected, then writes out and closes the capture, if recording
+
+        Returns: string documenting success or error that occurred
+        '''
+        status = self.Abort() if self.connected else '<SUCCESS> Driver closed'
+        if self.recorder != None:
+            self.recorder.close()
+        return status
@@ -0,0 +1,102 @@
+'''Python 3.9.4'''
+import math
+import threading
+
+
+class RunningStats():
+    '''Count, mean and spread of a stream of durations, without keeping the samples'''
+    __slots__ = ('count', 'mean', 'm2', 'min', 'max')
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0 #sum of squared differences from the mean (Welford)
+        self.min = None
+        self.max = None
+
+    def add(self, x):
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+        self.min = x if self.min == None or x < self.min else self.min
+        self.max = x if self.max == None or x > self.max else self.max
+
+    def std(self):
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+    def snapshot(self):
+        return {'count': self.count, 'mean': self.mean, 'std': self.std(), 'min': self.min, 'max': self.max}
+
+
+class DurationModel():
+    '''
+    How long each operation takes, learned from finished jobs, per operation and
+    per operation at each location (ie. a far slot takes longer to reach)
+    '''
+    def __init__(self, priors=None, minSamples=3):
+        '''
+        Arguments:
+            priors: dict of operation name -> seconds to assume before it is ever timed
+            minSamples: int of timings at a location before they are trusted over the operation's
+        '''
+        self.priors = dict(priors or {})
+        self.minSamples = minSamples
+        self.ops = {} #operation name -> RunningStats
+        self.locs = {} #(operation name, location string) -> RunningStats
+        self.lock = threading.Lock()
+
+    def observe(self, cmd, loc, seconds):
+        '''
+        Adds a timing of one finished operation
+
+        Arguments:
+            cmd: string of operation, ie. 'pick'
+            loc: string or int of location, None for home
+            seconds: float of clock seconds operation took
+        '''
+        with self.lock:
+            self.ops.setdefault(cmd, RunningStats()).add(seconds)
+            if loc != None:
+                self.locs.setdefault((cmd, str(loc)), RunningStats()).add(seconds)
+
+    def estimate(self, cmd, loc=None):
+        '''
+        Predicts how long one operation takes
+
+        Returns: (mean, std) in clock seconds, or None if never timed and no prior
+        '''
+        with self.lock:
+            stats = self.locs.get((cmd, str(loc))) if loc != None else None
+            if stats == None or stats.count < self.minSamples:
+                stats = self.ops.get(cmd)
+            if stats != None and stats.count > 0:
+                return stats.mean, stats.std()
+        if cmd in self.priors:
+            return float(self.priors[cmd]), 0.0
+        return None
+
+    def estimate_steps(self, steps):
+        '''
+        Predicts how long commands take back-to-back
+
+        Arguments:
+            steps: list of lists of commands and arguments, ie. [['pick', 2], ['place', 1]]
+
+        Returns: float of clock seconds, or None if any command was never timed
+        '''
+        total = 0.0
+        for cmd, loc in steps:
+            estimate = self.estimate(cmd, loc)
+            if estimate == None:
+                return None
+            total += estimate[0]
+        return total
+
+    def snapshot(self):
+        #JSON-able timings per operation and per location
+        with self.lock:
+            return {
+                'operations': {cmd: s.snapshot() for cmd, s in self.ops.items()},
+                'locations': {f'{cmd} {loc}': s.snapshot() for (cmd, loc), s in self.locs.items()},
+            }
@@ -0,0 +1,307 @@
+'''Python 3.9.4'''
+import tempfile
+import threading
+from collections import deque
+
+import scheduler
+from driver_interface import DriverInterface, Job
+from mockrobot_API import mockrobot_API
+from motion import MotionEngine
+from protocol import WIRE_FORMATS
+from simclock import RealClock
+from metrics import Metrics, get_logger
+
+log = get_logger('mockrobot.fleet')
+
+#how FleetManager picks a robot for the next job
+POLICIES = ['least-loaded', 'locality']
+
+
+class RobotFleet():
+    '''
+    Hosts several simulated robots in one process, each with its own deck and
+    address, all driven by one motion engine thread
+    VirtualClock suits a single robot only: with several, time jumps to the next
+    deadline before an idle robot's driver has sent its next command
+    '''
+    def __init__(self, count, clock=None, opDurations=None, scheme='inproc', name='robot'):
+        '''
+        Arguments:
+            count: int of robots to simulate
+            clock: RealClock or ScaledClock the robots' moves run on
+            opDurations: dict of operation name -> simulated seconds it takes
+            scheme: string of transport robots listen on, 'inproc', 'unix' or 'tcp'
+            name: string robot addresses are numbered from, ie. 'inproc://robot-0'
+        '''
+        self.engine = MotionEngine(clock)
+        self.robots = [mockrobot_API(opDurations=opDurations, registry=scheduler.LocationRegistry(),
+                                     engine=self.engine) for _ in range(count)]
+        if scheme == 'inproc':
+            self.listen = [f'inproc://{name}-{i}' for i in range(count)]
+        elif scheme == 'unix':
+            self.listen = [f'unix://{tempfile.gettempdir()}/{name}-{i}.sock' for i in range(count)]
+        else: #port 0 gives every robot a free port
+            self.listen = ['tcp://127.0.0.1:0'] * count
+        self.addresses = [] #strings: where each robot is listening once started
+
+    def start(self, timeout=5):
+        '''
+        Starts every robot's server in a background thread
+
+        Returns: list of transport address strings, one per robot
+        '''
+        for robot, address in zip(self.robots, self.listen):
+            threading.Thread(target=robot.start_server, args=(address,), daemon=True).start()
+        for robot in self.robots:
+            if not robot.ready.wait(timeout) or robot.address == None:
+                raise OSError('robot server did not start')
+        self.addresses = [robot.address for robot in self.robots]
+        log.info('FLEET LISTENING ON %s', self.addresses)
+        return self.addresses
+
+    def stop(self):
+        #stops robots accepting connections, drivers still connected stay served
+        for robot in self.robots:
+            robot.stop_server()
+
+
+class FleetJob(Job):
+    '''Program from the shared job stream, resolves once one of the robots has run it'''
+    def __init__(self, steps, submitted):
+        super().__init__('program', steps, submitted)
+        self.robot = None #int: index of robot the job was dispatched to
+        self.locations = {str(loc) for cmd, loc in steps if cmd in ('pick', 'place')}
+
+
+class FleetManager():
+    '''
+    Pool of driver connections, one per robot, that hands a shared stream of
+    programs to whichever robot can take it next
+    least-loaded sends each job to the robot with the fewest jobs outstanding;
+    locality keeps jobs on the robot whose deck last used their locations, so
+    a plate placed on one robot's deck is picked from the same deck
+    '''
+    def __init__(self, addresses, policy='least-loaded', depth=2, clock=None, wireFormats=WIRE_FORMATS):
+        '''
+        Arguments:
+            addresses: list of transport address strings, one per robot
+            policy: string from POLICIES
+            depth: int of jobs handed to each robot's driver ahead of time, more than 1
+                   lets a robot start its next job without waiting on the fleet
+            clock: RealClock or ScaledClock matching the robots'
+            wireFormats: list of wire formats to offer robots, most preferred first
+        '''
+        if policy not in POLICIES:
+            raise ValueError(f'policy must be one of {POLICIES}')
+        self.addresses = list(addresses)
+        self.policy = policy
+        self.depth = depth
+        self.clock = clock or RealClock()
+        #each robot has its own deck, so each driver checks against its own registry
+        self.drivers = [DriverInterface(self.clock, scheduler.LocationRegistry(), wireFormats)
+                        for _ in self.addresses]
+        self.outstanding = [0] * len(self.drivers) #jobs handed to each driver, not yet done
+        self.dispatched = [0] * len(self.drivers) #jobs ever handed to each driver
+        self.busy = [0.0] * len(self.drivers) #clock seconds each robot spent on jobs
+        self.affinity = {} #location string -> index of robot whose deck last used it
+        self.jobs = deque() #FleetJobs waiting for a robot
+        self.cond = threading.Condition() #wakes dispatcher on new jobs and finished ones
+        self.running = False
+        self.metrics = Metrics() #counters and latency histograms, see get_report
+        self.first_submitted = None #float: clock time of the first job
+        self.last_finished = None #float: clock time the last job finished
+
+    def OpenConnections(self):
+        '''
+        Connects a driver to every robot and starts dispatching jobs
+
+        Returns: list of strings documenting success or error per robot
+        '''
+        statuses = [driver.OpenConnection(address, '') for driver, address in zip(self.drivers, self.addresses)]
+        with self.cond:
+            if not self.running and any(driver.connected for driver in self.drivers):
+                self.running = True
+                dispatch_thread = threading.Thread(target=self.dispatch_jobs, daemon=True)
+                dispatch_thread.start()
+        return statuses
+
+    def Abort(self):
+        '''
+        Stops dispatching and disconnects every robot, jobs still waiting are refused
+
+        Returns: list of strings documenting success or error per robot
+        '''
+        with self.cond:
+            self.running = False
+            left = list(self.jobs)
+            self.jobs.clear()
+            self.cond.notify_all()
+        for job in left:
+            job.set_result('<DRIVER ERROR> No connection available')
+        return [driver.Abort() for driver in self.drivers]
+
+    def submit_program(self, steps, callback=None):
+        '''
+        Adds a program to the shared job stream, it runs back-to-back on one robot
+
+        Arguments:
+            steps: list of lists containing series of commands, ie. [['pick', 2], ['place', 1]]
+            callback: function called with the FleetJob once a robot is done with it
+
+        Returns: FleetJob resolving to the final process status or error string
+        '''
+        now = self.clock.now()
+        if not isinstance(steps, list) or steps == [] or \
+                not all(isinstance(step, (list, tuple)) and len(step) == 2 for step in steps):
+            job = FleetJob([], now)
+            job.set_result('<INPUT ERROR> Bad program')
+            return job
+        job = FleetJob([list(step) for step in steps], now)
+        if callback != None:
+            job.add_done_callback(callback)
+        with self.cond:
+            if not self.running:
+                job.set_result('<DRIVER ERROR> No connection available')
+                return job
+            if self.first_submitted == None:
+                self.first_submitted = now
+            self.metrics.count('jobs_submitted')
+            self.jobs.append(job)
+            self.cond.notify_all()
+        return job
+
+    def ExecuteQueue(self, programs):
+        '''
+        Runs programs across the fleet and waits for all of them
+
+        Arguments:
+            programs: list of programs, ie. [[['pick', 2], ['place', 1]], ...]
+
+        Returns: list of final process status or error string per program
+        '''
+        return [job.result() for job in [self.submit_program(steps) for steps in programs]]
+
+    def choose_robot(self, job, free, accepting):
+        '''
+        Picks robot for a job by policy
+
+        Arguments:
+            job: FleetJob waiting for a robot
+            free: list of indexes of robots below depth whose deck can run the job
+            accepting: list of indexes of connected robots whose deck can run the job,
+                       once the jobs already queued on them have run
+
+        Returns: int index of robot, or None if the job has to wait
+        '''
+        if self.policy == 'locality':
+            for cmd, loc in job.arg: #first location a deck has used decides, ie. the source
+                home = self.affinity.get(str(loc))
+                if home != None and home in accepting: #wait for the robot whose deck holds the plate
+                    return home if home in free else None
+        if not free:
+            return None
+        return min(free, key=lambda r: (self.outstanding[r], self.dispatched[r], r))
+
+    def next_assignment(self):
+        '''
+        Finds first waiting job that can go to a robot now, jobs never overtake
+        an earlier waiting job that uses one of the same locations
+        A robot is only chosen if its own deck can run the job
+
+        Returns: (job, robot index, None) to dispatch, (job, None, error string) for
+                 a job no robot's deck can run, or None if nothing can go yet
+        '''
+        connected = [r for r, driver in enumerate(self.drivers) if driver.connected]
+        if not any(self.outstanding[r] < self.depth for r in connected):
+            return None
+        blocked = set()
+        for job in self.jobs:
+            if not job.locations & blocked:
+                errors = {r: self.drivers[r].validate(job.arg) for r in connected}
+                accepting = [r for r in connected if errors[r] == None]
+                if not accepting:
+                    return job, None, errors[connected[0]]
+                free = [r for r in accepting if self.outstanding[r] < self.depth]
+                robot = self.choose_robot(job, free, accepting)
+                if robot != None:
+                    return job, robot, None
+            blocked |= job.locations
+        return None
+
+    def dispatch_jobs(self):
+        '''
+        Hands waiting jobs to robots' drivers as they free up, waking on new
+        and finished jobs instead of polling
+        '''
+        while True:
+            with self.cond:
+                assignment = None
+                while self.running:
+                    assignment = self.next_assignment()
+                    if assignment != None:
+                        break
+                    self.cond.wait()
+                if assignment == None: #fleet aborted
+                    break
+                job, robot, error = assignment
+                self.jobs.remove(job)
+                if error == None:
+                    self.outstanding[robot] += 1
+                    self.dispatched[robot] += 1
+                    for loc in job.locations:
+                        self.affinity[loc] = robot
+                else: #refused by every deck, later jobs go on
+                    self.metrics.count('jobs_refused')
+                    self.last_finished = job.finished = self.clock.now()
+            if error != None:
+                job.set_result(f'<INPUT ERROR> {error}')
+                continue
+            job.robot = robot
+            job.dispatched = self.clock.now()
+            self.metrics.observe('queue_wait', job.dispatched - job.submitted)
+            log.info('FLEET DISPATCHING TO %s: %s', robot, job.arg)
+            self.drivers[robot].submit_program(job.arg, lambda done, job=job: self.job_done(job, done))
+
+    def job_done(self, job, done):
+        #driver finished (or refused) a job, free its robot and resolve the fleet job
+        with self.cond:
+            self.outstanding[job.robot] -= 1
+            if done.dispatched != None:
+                self.busy[job.robot] += done.finished - done.dispatched
+            self.last_finished = job.finished = self.clock.now()
+            self.cond.notify_all()
+        job.progress = done.progress
+        result = done.result()
+        self.metrics.count('jobs_completed' if result == 'Finished Successfully' else 'jobs_failed')
+        self.metrics.observe('job_time', job.finished - job.dispatched)
+        job.set_result(result)
+
+    def get_report(self):
+        '''
+        Gives aggregate throughput of the fleet and how busy each robot was
+
+        Returns: dict with jobs completed, failed and refused, clock seconds from first job
+                 to last finished, jobs per second, and per robot jobs and utilization
+        '''
+        with self.cond:
+            counters = self.metrics.snapshot()['counters']
+            completed = counters.get('jobs_completed', 0)
+            elapsed = None
+            if self.first_submitted != None and self.last_finished != None:
+                elapsed = self.last_finished - self.first_submitted
+            return {
+                'policy': self.policy,
+                'robots': len(self.drivers),
+                'jobs_completed': completed,
+                'jobs_failed': counters.get('jobs_failed', 0),
+                'jobs_refused': counters.get('jobs_refused', 0),
+                'jobs_waiting': len(self.jobs),
+                'elapsed': elapsed,
+                'throughput': completed / elapsed if elapsed else None,
+                'per_robot': [{
+                    'address': address,
+                    'jobs': self.dispatched[r],
+                    'busy': self.busy[r],
+                    'utilization': self.busy[r] / elapsed if elapsed else None,
+                } for r, address in enumerate(self.addresses)],
+            }
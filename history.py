@@ -0,0 +1,69 @@
+'''Python 3.9.4'''
+import array
+import threading
+
+
+class StatusHistory():
+    '''
+    Fixed-size ring of status transitions kept in flat arrays, so recording one
+    is a few stores and a client can fetch everything after a sequence number
+    instead of polling for the current status
+    '''
+    def __init__(self, size=1024):
+        '''
+        Arguments:
+            size: int of transitions kept, older ones are overwritten
+        '''
+        self.size = size
+        self.times = array.array('d', [0.0]) * size #clock time of each transition
+        self.statuses = array.array('h', [0]) * size #status ID moved to
+        self.commands = array.array('H', [0]) * size #index into names of the command causing it
+        self.names = [None] #command strings seen so far, 0 is no command
+        self.codes = {None: 0} #command string -> index into names
+        self.seq = 0 #int: sequence number of latest transition, the first is 1
+        self.lock = threading.Lock()
+
+    def record(self, time, statusID, command=None):
+        '''
+        Adds a transition, overwriting the oldest once the ring is full
+
+        Arguments:
+            time: float of clock time of the transition
+            statusID: int of status moved to
+            command: string of command that caused it, ie. 'pick'
+
+        Returns: int sequence number of the transition
+        '''
+        with self.lock:
+            code = self.codes.get(command)
+            if code == None:
+                code = self.codes[command] = len(self.names)
+                self.names.append(command)
+            slot = self.seq % self.size
+            self.times[slot] = time
+            self.statuses[slot] = statusID
+            self.commands[slot] = code
+            self.seq += 1
+            return self.seq
+
+    def since(self, seq):
+        '''
+        Gives every transition after sequence number seq still in the ring
+
+        Arguments:
+            seq: int of last sequence number the client has seen, 0 for everything;
+                 one beyond the latest (ie. from before a server restart) also gives everything
+
+        Returns: dict with 'seq' of latest transition, 'missed' count already overwritten,
+                 'reset' True if seq was from before a restart, and 'transitions'
+                 list of [seq, time, statusID, command]
+        '''
+        with self.lock:
+            reset = seq > self.seq
+            seq = 0 if reset else max(seq, 0)
+            first = max(seq + 1, self.seq - self.size + 1)
+            transitions = []
+            for n in range(first, self.seq + 1):
+                slot = (n - 1) % self.size
+                transitions.append([n, self.times[slot], self.statuses[slot], self.names[self.commands[slot]]])
+            return {'seq': self.seq, 'missed': first - seq - 1, 'reset': reset, 'transitions': transitions}
@@ -0,0 +1,167 @@
+'''Python 3.9.4'''
+import os
+import json
+import threading
+
+from metrics import get_logger
+
+log = get_logger('mockrobot.journal')
+
+
+class JournaledJob():
+    '''What the journal knows about one job, rebuilt from its records'''
+    def __init__(self, job, cmd, arg):
+        self.job = job #int: journal id of the job
+        self.cmd = cmd #string: command sent to robot, 'program' for several steps
+        self.arg = arg #string, int or list of steps: argument of command
+        self.dispatched = False #boolean: sent to robot, may have (partly) run
+        self.completed = 0 #int: program steps recorded as finished
+        self.result = None #string: final process status once done
+
+    def steps(self):
+        #commands of the job, a single command is a program of one step
+        return [list(step) for step in self.arg] if self.cmd == 'program' else [[self.cmd, self.arg]]
+
+
+class JobJournal():
+    '''
+    Append-only file of submitted, dispatched and completed jobs, so a driver
+    that crashed or was aborted can pick its jobs up again from the exact step
+    Records are JSON lines; every record appended while the previous fsync runs
+    is written out by the next one, so callers waiting on durability share fsyncs
+    '''
+    def __init__(self, path):
+        '''
+        Arguments:
+            path: string of journal file, created if missing
+        '''
+        self.path = path
+        self.jobs = {} #journal id -> JournaledJob, unfinished and finished
+        self.cond = threading.Condition()
+        self.buffer = [] #lines appended but not yet written
+        self.appended = 0 #int: records appended
+        self.synced = 0 #int: records written and fsynced
+        self.closed = False
+        self.highwater = 0 #int: largest id ever used, kept through compaction
+        self.replay()
+        #never hand out an id again, the robot's lastRun may still hold one from an earlier session
+        self.next_id = self.highwater + 1
+        self.compact()
+        self.file = open(self.path, 'a', encoding='utf-8')
+        flush_thread = threading.Thread(target=self.flush, daemon=True)
+        flush_thread.start()
+
+    def replay(self):
+        #rebuild job states from the file, a torn last line from a crash is skipped
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    log.warning('JOURNAL: skipping unreadable record in %s', self.path)
+                    continue
+                self.apply(record)
+
+    def apply(self, record):
+        #updates job state from one record
+        op, job = record['op'], record['job']
+        self.highwater = max(self.highwater, job)
+        if op == 'highwater':
+            return
+        if op in ('submit', 'resume'):
+            self.jobs[job] = JournaledJob(job, record['cmd'], record['arg'])
+            return
+        state = self.jobs.get(job)
+        if state == None:
+            return
+        if op == 'dispatch':
+            state.dispatched = True
+        elif op == 'step' and record['statusID'] == 102:
+            state.completed = max(state.completed, record['step'] + 1)
+        elif op == 'done':
+            state.result = record['result']
+
+    def compact(self):
+        #rewrites file with only unfinished jobs so it does not grow across sessions
+        unfinished = self.unfinished()
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'op': 'highwater', 'job': self.highwater}) + '\n')
+            for state in unfinished:
+                f.write(json.dumps({'op': 'submit', 'job': state.job, 'cmd': state.cmd, 'arg': state.arg}) + '\n')
+                if state.dispatched:
+                    f.write(json.dumps({'op': 'dispatch', 'job': state.job}) + '\n')
+                if state.completed:
+                    f.write(json.dumps({'op': 'step', 'job': state.job, 'step': state.completed - 1,
+                                        'statusID': 102}) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self.jobs = {state.job: state for state in unfinished}
+
+    def unfinished(self):
+        #jobs without a done record, oldest first
+        with self.cond:
+            return [state for job, state in sorted(self.jobs.items()) if state.result == None]
+
+    def new_id(self):
+        with self.cond:
+            job = self.next_id
+            self.next_id += 1
+            return job
+
+    def append(self, record, sync=False):
+        '''
+        Adds record to the journal
+
+        Arguments:
+            record: dict with 'op' ('submit', 'dispatch', 'step', 'done', 'resume' or 'highwater') and 'job'
+            sync: boolean, True to wait until the record is on disk
+        '''
+        line = json.dumps(record) + '\n'
+        with self.cond:
+            if self.closed:
+                raise ValueError('journal closed')
+            self.apply(record)
+            self.buffer.append(line)
+            self.appended += 1
+            self.cond.notify_all()
+            if sync:
+                self.wait_synced(self.appended)
+
+    def sync(self):
+        #waits until every record appended so far is on disk
+        with self.cond:
+            self.wait_synced(self.appended)
+
+    def wait_synced(self, count):
+        #caller holds cond
+        while self.synced < count and not self.closed:
+            self.cond.wait()
+
+    def flush(self):
+        '''Writes and fsyncs buffered records in batches until closed'''
+        while True:
+            with self.cond:
+                while not self.buffer and not self.closed:
+                    self.cond.wait()
+                if not self.buffer: #closed with nothing left
+                    break
+                lines, self.buffer = self.buffer, []
+                count = self.appended
+            self.file.write(''.join(lines))
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            with self.cond:
+                self.synced = count
+                self.cond.notify_all()
+        self.file.close()
+
+    def close(self):
+        #writes out what is buffered and stops the flush thread
+        self.sync()
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
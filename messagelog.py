@@ -0,0 +1,54 @@
+'''Python 3.9.4'''
+from collections import deque
+
+
+class MessageLog():
+    '''
+    Latest messages of a session in a fixed-size ring, with the messages matching
+    the current filter kept alongside as they come and go, so a display only ever
+    renders the few rows it has room for
+    '''
+    def __init__(self, size=10000):
+        '''
+        Arguments:
+            size: int of messages kept, older ones are dropped
+        '''
+        self.messages = deque(maxlen=size) #(seq, text) of every kept message
+        self.view = deque() #(seq, text) of kept messages matching filter
+        self.filter = '' #string: lowercase text messages in view contain
+        self.seq = 0 #int: number of messages ever appended
+
+    def append(self, text):
+        #adds message, dropping the oldest once the ring is full
+        self.seq += 1
+        self.messages.append((self.seq, text))
+        first = self.messages[0][0]
+        while self.view and self.view[0][0] < first:
+            self.view.popleft()
+        if self.filter in text.lower():
+            self.view.append((self.seq, text))
+
+    def set_filter(self, text):
+        '''
+        Keeps only messages containing text in view, case insensitive
+
+        Arguments:
+            text: string to look for, '' for every message
+        '''
+        self.filter = text.lower()
+        self.view = deque(m for m in self.messages if self.filter in m[1].lower())
+
+    def rows(self, first, count):
+        '''
+        Gives part of the filtered messages
+
+        Arguments:
+            first: int of index into view of first row
+            count: int of rows wanted
+
+        Returns: list of up to count message strings
+        '''
+        return [self.view[i][1] for i in range(max(first, 0), min(first + count, len(self.view)))]
+
+    def __len__(self):
+        return len(self.view)
@@ -0,0 +1,131 @@
+'''Python 3.9.4'''
+import math
+import time
+import logging
+import threading
+
+
+class Histogram():
+    '''
+    Latency histogram with power-of-two buckets from 1 microsecond up,
+    cheap enough to record every request on the hot path
+    '''
+    BUCKETS = 48 #2**47 microseconds is over four years
+
+    def __init__(self):
+        self.counts = [0] * self.BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, seconds):
+        #bucket i holds values below 2**i microseconds
+        exponent = math.frexp(seconds * 1e6)[1] if seconds > 0 else 0
+        self.counts[min(max(exponent, 0), self.BUCKETS - 1)] += 1
+        self.count += 1
+        self.total += seconds
+        self.min = seconds if self.min == None or seconds < self.min else self.min
+        self.max = seconds if self.max == None or seconds > self.max else self.max
+
+    def percentile(self, p):
+        #upper edge of bucket holding the p-th percentile, in seconds
+        if self.count == 0:
+            return None
+        rank = p / 100 * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return min(2 ** i / 1e6, self.max)
+        return self.max
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else None,
+            'min': self.min,
+            'max': self.max,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+        }
+
+
+class Metrics():
+    '''Named counters and latency histograms of one driver or simulator'''
+    def __init__(self):
+        self.started = time.monotonic()
+        self.counters = {}
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def observe(self, name, seconds):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram == None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    def snapshot(self):
+        '''
+        Gives every metric as JSON-able dict, counters also as rate per second
+
+        Returns: dict with uptime, counters, rates and histograms
+        '''
+        with self.lock:
+            uptime = time.monotonic() - self.started
+            return {
+                'uptime': uptime,
+                'counters': dict(self.counters),
+                'rates': {name: n / uptime for name, n in self.counters.items()} if uptime > 0 else {},
+                'histograms': {name: h.snapshot() for name, h in self.histograms.items()},
+            }
+
+
+class RateLimitFilter(logging.Filter):
+    '''
+    Lets each message template through at most burst times per period,
+    then logs once how many were dropped
+    '''
+    def __init__(self, burst=10, period=1.0):
+        super().__init__()
+        self.burst = burst
+        self.period = period
+        self.windows = {} #template -> [window start, count in window, dropped]
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        now = time.monotonic()
+        with self.lock:
+            window = self.windows.setdefault(record.msg, [now, 0, 0])
+            if now - window[0] >= self.period:
+                if window[2]:
+                    record.msg = f'{record.msg} ({window[2]} similar messages dropped)'
+                window[:] = [now, 0, 0]
+            window[1] += 1
+            if window[1] > self.burst:
+                window[2] += 1
+                return False
+            return True
+
+
+def get_logger(name, burst=10, period=1.0):
+    '''
+    Gives logger that drops repeats of the same message beyond burst per period
+
+    Arguments:
+        name: string of logger name, ie. 'mockrobot.api'
+        burst: int of messages per template let through each period
+        period: float of seconds per period
+
+    Returns: logging.Logger
+    '''
+    logger = logging.getLogger(name)
+    if not any(isinstance(f, RateLimitFilter) for f in logger.filters):
+        logger.addFilter(RateLimitFilter(burst, period))
+    return logger
@@ -1,15 +1,60 @@
 '''Python 3.9.4'''
-import socket
-import time
+import queue
 import threading
-import json
+import asyncio
+import argparse
+import time
+import math
+import struct
+import logging
+import itertools
+
+import scheduler
+import transport
+from protocol import FORMAT, pack_frame, read_frame_async, JsonCodec, make_codec, WIRE_FORMATS
+from motion import MotionEngine
+from history import StatusHistory
+from planner import grid_coords
+from capture import WireRecorder, TO_ROBOT, TO_DRIVER
+from simclock import make_clock
+from metrics import Metrics, get_logger
+
+log = get_logger('mockrobot.api')
+
+
+class DriverSession():
+    '''State of one connection, shared by the threaded and asyncio servers'''
+    def __init__(self, addr, push, id=0):
+        self.id = id #int: number of the connection since server started, for captures
+        self.addr = addr #tuple or string of the other end of the connection
+        self.push = push #function sending an encoded message to this connection
+        self.controller = False #boolean: only the controller can move the robot
+        self.open = True #boolean: False once driver asked to disconnect
+        self.codec = JsonCodec() #wire format, until driver agrees on another in hello
+
+    def greeting(self):
+        #first message tells driver whether it controls the robot or only observes
+        return ('WELCOME' if self.controller else 'OBSERVER').encode(FORMAT)
+
 
 
 class mockrobot_API():
-    def __init__(self):
+    def __init__(self, clock=None, opDurations=None, registry=None, engine=None, historySize=1024, recorder=None,
+                 outboxSize=1024, armSpeed=None, coords=None):
+        '''
+        Arguments:
+            clock: RealClock, ScaledClock or VirtualClock that robot moves run on
+            opDurations: dict of operation name -> simulated seconds it takes
+            registry: scheduler.LocationRegistry of the deck, defaults to the shared one
+            engine: MotionEngine shared with other simulated robots, clock is then the engine's
+            historySize: int of status transitions kept for the history command
+            recorder: string of capture file path or WireRecorder, to record every message for replay.py
+            outboxSize: int of messages a connection can fall behind before it is dropped
+            armSpeed: float of distance units arm travels per second, None for moves without travel
+            coords: dict of location string -> (x, y), defaults to planner.grid_coords of valid locations
+        '''
         self.SERVER = '127.0.0.1'
         self.PORT = 1000
-        self.BUFFER_SIZE = 1024
         self.FORMAT = 'utf-8'
         self.statusDict = {
                 100: 'Idle',
@@ -21,111 +66,426 @@ class mockrobot_API():
 
         self.currentStatusID = 100
         self.main_addr = None #str of the first IP to connect
+        self.address = None #string: transport address server is listening on
+        self.listener = None #transport listener of the threaded server
+        self.ready = threading.Event() #set once server is listening on address
+        self.subscribers = set() #DriverSessions that get pushed status events
+        self.outboxSize = outboxSize #messages queued per connection, see handle_driver
+        self.session_lock = threading.Lock() #only one connection can become controller
+        self.status_lock = threading.RLock() #guards currentStatusID transitions
+        #seconds for testing, stand in for minutes on the real robot
+        self.opDurations = {'home': 2, 'pick': 5, 'place': 5}
+        self.opDurations.update(opDurations or {})
+        self.engine = engine or MotionEngine(clock) #one worker thread completes every robot move
+        self.move = None #MotionTimer of the robot move in progress
+        self.moveStep = None #list of command and argument of the move in progress
+        self.moveStarted = None #float: clock time the move in progress started
+        self.metrics = Metrics() #counters and latency histograms, see 'metrics' command
+        self.registry = registry or scheduler.registry #where plates are on the deck
+        self.programSteps = None #list of commands of the program in progress
+        self.programIndex = 0 #int: step of the program in progress
+        self.lastRun = None #dict: job tag, steps, steps completed and status of latest move or program
+        self.history = StatusHistory(historySize) #timestamped status transitions, see 'history' command
+        self.recorder = WireRecorder(recorder) if isinstance(recorder, str) else recorder
+        self.session_ids = itertools.count(1)
+        #arm travel added to each move, same deck layout as planner.TransferPlanner
+        self.armSpeed = armSpeed
+        self.coords = coords or grid_coords(scheduler.valid_locations)
+        self.armAt = (0, 0) #(x, y) arm moves from, home is the origin
+
+    def start_server(self, address=None):
+        '''
+        Starts server looks for connections and starts a thread per connection
 
-    def start_server(self):
-        '''Starts server looks for connections and starts a thread per connection'''
-        print(f'SERVER STARTING')
-        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        server.bind((self.SERVER, self.PORT))
-        print(f'SERVER LISTENING ON {self.SERVER}')
-        server.listen()
+        Arguments:
+            address: string of transport address to listen on, ie. 'unix:///tmp/mockrobot.sock'
+                     or 'inproc://robot', defaults to TCP on SERVER and PORT
+        '''
+        log.info('SERVER STARTING')
+        try:
+            self.listener = transport.listen(address or f'tcp://{self.SERVER}:{self.PORT}')
+        except (OSError, ValueError): #address in use or not understood, nothing to serve
+            self.ready.set()
+            raise
+        self.address = self.listener.address
+        self.PORT = getattr(self.listener, 'port', None) or self.PORT
+        log.info('SERVER LISTENING ON %s', self.address)
+        self.ready.set()
         while True:
-            conn, addr = server.accept()
-            t = threading.Thread(target=self.handle_driver, args=(conn, addr))
+            try:
+                conn = self.listener.accept()
+            except OSError: #listener closed by stop_server
+                break
+            t = threading.Thread(target=self.handle_driver, args=(conn,), daemon=True)
             t.start()
 
-    def handle_driver(self, conn, addr):
+    def stop_server(self):
+        #stops threaded server accepting connections, connected drivers stay served
+        if self.listener != None:
+            self.listener.close()
+
+    def close(self):
+        #stops accepting connections and writes out and closes the capture, if recording
+        self.stop_server()
+        if self.recorder != None:
+            self.recorder.close()
+
+    async def start_async_server(self, address=None):
+        '''
+        Starts event-loop server that serves every connection from one thread,
+        so any number of observers can attach next to the controlling driver
+
+        Arguments:
+            address: string of tcp or unix transport address to listen on,
+                     defaults to TCP on SERVER and PORT
+        '''
+        log.info('SERVER STARTING (ASYNC)')
+        scheme, location = transport.parse_address(address or f'tcp://{self.SERVER}:{self.PORT}')
+        if scheme == 'unix':
+            server = await asyncio.start_unix_server(self.handle_driver_async, location, backlog=1024)
+            self.address = f'unix://{location}'
+        elif scheme == 'tcp':
+            server = await asyncio.start_server(self.handle_driver_async, location[0], location[1], backlog=1024)
+            self.PORT = server.sockets[0].getsockname()[1] #port 0 binds to a free ephemeral port
+            self.address = f'tcp://{location[0]}:{self.PORT}'
+        else: #queues have no event loop integration, serve them from threads
+            raise ValueError('in-process transport needs the threaded server')
+        log.info('SERVER LISTENING ON %s', self.address)
+        self.ready.set()
+        async with server:
+            await server.serve_forever()
+
+    def handle_driver(self, conn):
+        '''
+        Recieves commands and sends responses to commands, one thread per connection
+        Responses and status pushes go through the connection's bounded outbox to its
+        own writer thread, so a driver that stops reading holds up nobody but itself
+
+        Arguments:
+            conn: transport connection with send, recv and close
+        '''
+        outbox = queue.Queue(self.outboxSize)
+
+        def push(payload):
+            #never blocks, a driver that fell outboxSize messages behind is dropped instead
+            try:
+                outbox.put_nowait(payload)
+            except queue.Full:
+                self.drop_session(session)
+                conn.close()
+
+        session = self.open_session(conn.peer, push)
+        writer_thread = threading.Thread(target=self.send_messages, args=(conn, outbox), daemon=True)
+        writer_thread.start()
+        try:
+            push(session.greeting())
+            while session.open:
+                msg = conn.recv()
+                if msg == None: #client closed connection, disconnect
+                    break
+                push(self.handle_command(session, msg))
+        except OSError: #if client forcefully closed, disconnect
+            pass
+        finally: #even if a command failed, so the robot can be controlled again
+            self.close_session(session)
+            try: #writer closes connection once everything before it is sent
+                outbox.put_nowait(None)
+            except queue.Full:
+                conn.close()
+
+    def send_messages(self, conn, outbox):
+        '''
+        Writes a threaded connection's queued messages in order until None is queued
+
+        Arguments:
+            conn: transport connection with send, recv and close
+            outbox: queue.Queue of encoded messages
+        '''
+        while True:
+            payload = outbox.get()
+            if payload == None:
+                break
+            try:
+                conn.send(payload)
+            except OSError: #driver went away, also wakes up its reading thread
+                break
+        conn.close()
+
+    async def handle_driver_async(self, reader, writer):
+        '''
+        Recieves commands and sends responses to commands on the event loop
+
+        Arguments:
+            reader: asyncio.StreamReader of the connection
+            writer: asyncio.StreamWriter of the connection
+        '''
+        addr = writer.get_extra_info('peername') or self.address
+        loop = asyncio.get_running_loop()
+        loop_thread = threading.get_ident()
+        outbox = asyncio.Queue(self.outboxSize)
+
+        def queue_message(payload):
+            #on the loop, a driver that fell outboxSize messages behind is dropped
+            try:
+                outbox.put_nowait(payload)
+            except asyncio.QueueFull:
+                self.drop_session(session)
+                writer.transport.abort() #discards what it could not send
+
+        def push(payload):
+            #status can change on the loop (new command) or on a robot move thread
+            if threading.get_ident() == loop_thread:
+                queue_message(payload)
+            else:
+                loop.call_soon_threadsafe(queue_message, payload)
+
+        session = self.open_session(addr, push)
+        send_task = loop.create_task(self.send_messages_async(writer, outbox))
+        try:
+            push(session.greeting())
+            while session.open:
+                msg = await read_frame_async(reader)
+                if msg == None: #client closed connection, disconnect
+                    break
+                push(self.handle_command(session, msg))
+        except OSError: #if client forcefully closed, disconnect
+            pass
+        finally: #even if a command failed, so the robot can be controlled again
+            self.close_session(session)
+            try: #writer closes connection once everything before it is sent
+                outbox.put_nowait(None)
+            except asyncio.QueueFull:
+                writer.transport.abort()
+        await send_task
+
+    async def send_messages_async(self, writer, outbox):
+        '''
+        Writes an event-loop connection's queued messages in order until None is queued,
+        waiting for each to drain so only this connection waits on a slow driver
+
+        Arguments:
+            writer: asyncio.StreamWriter of the connection
+            outbox: asyncio.Queue of encoded messages
+        '''
+        while True:
+            payload = await outbox.get()
+            if payload == None:
+                break
+            try:
+                writer.write(pack_frame(payload))
+                await writer.drain()
+            except OSError: #driver went away or was dropped
+                break
+        writer.close()
+
+    def open_session(self, addr, push):
         '''
-        Recieves commands and sends responses to commands
+        Registers new connection, only the first connected driver controls the robot
+        and every connection after it is a read-only observer
 
         Arguments:
-            conn: object representing connection
-            addr: tuple representing IP and port connected
-        '''
-        print(f'NEW CONNECTION: {addr}')
-        #only accept commands from the first connected driver
-        if self.main_addr == None: #check if server has existing connection
-            self.main_addr = addr #update connection
-            conn.send('WELCOME'.encode(self.FORMAT))
-            while self.main_addr != None:
-                try:
-                    msg = conn.recv(self.BUFFER_SIZE).decode(self.FORMAT)
-                    msg_dict = json.loads(msg) #unpack recieved message
-                    cmd = msg_dict['command']
-                    param = msg_dict['param']
-
-                    if cmd != 'getCurrentStatusID': #for debugging to see commands and args
-                        print(msg)
-
-                    #perform command
-                    if cmd == 'disconnect': #disconnect
-                        response_dict = {'request_status': 200, 'data': self.currentStatusID}
-                        response = json.dumps(response_dict).encode(self.FORMAT)
-                        conn.send(response)
-                        self.main_addr = None
-                        print(f'DISCONNECTING: {addr}')
-                    elif cmd == 'home': #home
-                        conn.send(self.home())
-                    elif cmd == 'pick': #pick
-                        conn.send(self.pick(param))
-                    elif cmd == 'place': #place
-                        conn.send(self.place(param))
-                    elif cmd == 'status': #give status ID
-                        response_dict = {'request_status': 200, 'data': self.status(param)}
-                        response = json.dumps(response_dict).encode(self.FORMAT)
-                        conn.send(response) #give current process status
-                    elif cmd == 'getCurrentStatusID':
-                        response_dict = {'request_status': 200, 'data': self.getCurrentStatusID()}
-                        response = json.dumps(response_dict).encode(self.FORMAT)
-                        conn.send(response)
-                    else: #unknown command response
-                        response_dict = {'request_status': 400, 'data': 'UNKNOWN COMMAND'}
-                        response = json.dumps(response_dict).encode(self.FORMAT)
-                        conn.send(response)
-                except ConnectionResetError: #if client forcefully closed, disconnect
-                    self.main_addr = None
-                    print(f'DISCONNECTING: {addr}')
-        else: #tell other connections that server has existing connection
-            conn.send('EXISTING_CONN'.encode(self.FORMAT))
-
-    def home(self):
-        #send error if in progress with negative processID
-        if self.currentStatusID == 101:
-            return {'request_status': 400, 'data': -300}
+            addr: tuple or string of the other end of the connection
+            push: function sending an encoded message to this connection
 
+        Returns: DriverSession of the connection
+        '''
+        log.info('NEW CONNECTION: %s', addr)
+        session = DriverSession(addr, push, next(self.session_ids))
+        with self.session_lock:
+            if self.main_addr == None: #check if server has existing connection
+                self.main_addr = addr #update connection
+                session.controller = True
+        self.metrics.count('connections' if session.controller else 'observer_connections')
+        return session
+
+    def drop_session(self, session):
+        #stops serving a driver that stopped reading, its connection is closed by the caller
+        session.open = False
+        self.subscribers.discard(session)
+        self.metrics.count('connections_dropped')
+        log.warning('DROPPING CONNECTION: %s fell %s messages behind', session.addr, self.outboxSize)
+
+    def close_session(self, session):
+        #forget connection, a controller leaving aborts the robot move in progress
+        self.subscribers.discard(session)
+        if session.controller:
+            session.controller = False
+            self.main_addr = None
+            self.abort_move()
+            log.info('DISCONNECTING: %s', session.addr)
+        if self.recorder != None: #session is complete in the capture
+            self.recorder.flush()
+
+    def handle_command(self, session, msg):
+        '''
+        Performs one command for a connection, shared by the threaded and asyncio servers
+
+        Arguments:
+            session: DriverSession the command came in on
+            msg: bytes of the request in the session's wire format
+
+        Returns: bytes of the encoded response, framing is left to the transport
+        '''
+        started = time.perf_counter()
+        if self.recorder != None:
+            self.recorder.record(TO_ROBOT, session.id, session.codec.name, msg)
+        codec = session.codec #response goes out in the format the request came in
+        msg_dict, cmd = {}, 'badRequest'
+        try:
+            msg_dict = session.codec.decode(msg) #unpack recieved message
+            cmd = msg_dict['command']
+            response_dict = self.run_command(session, cmd, msg_dict['param'], msg_dict)
+        except (ValueError, KeyError, TypeError, AttributeError, IndexError, struct.error) as e:
+            #undecodable message or parameter of the wrong kind, ie. status 999
+            log.warning('BAD REQUEST: %r (%s)', msg[:100], e)
+            response_dict = {'request_status': 400, 'data': 'BAD REQUEST'}
+        cmd = cmd if isinstance(cmd, str) else 'badRequest'
+
+        #tag response with request id so driver can match it to the caller
+        response_dict['id'] = msg_dict.get('id') if isinstance(msg_dict, dict) else None
+        payload = codec.encode(response_dict)
+        if self.recorder != None:
+            self.recorder.record(TO_DRIVER, session.id, codec.name, payload)
+        self.metrics.count(f'commands.{cmd}')
+        self.metrics.observe('command_time', time.perf_counter() - started)
+        return payload
+
+    def run_command(self, session, cmd, param, msg_dict):
+        '''
+        Performs one decoded command for a connection
+
+        Arguments:
+            session: DriverSession the command came in on
+            cmd: string of command name
+            param: parameter of command, ie. location or list of program steps
+            msg_dict: dict of the whole request, ie. with the job tag of a move
+
+        Returns: response dict with request_status and data
+        '''
+        if session.controller and cmd != 'getCurrentStatusID': #for debugging to see commands and args
+            log.info('COMMAND: %s', msg_dict)
+
+        #perform command
+        if cmd in ('home', 'pick', 'place', 'program') and not session.controller: #observers are read-only
+            response_dict = {'request_status': 400, 'data': 'READ ONLY CONNECTION'}
+        elif cmd == 'disconnect': #disconnect
+            response_dict = {'request_status': 200, 'data': self.currentStatusID}
+            session.open = False
+        elif cmd == 'hello': #agree on wire format, first one driver and server both know
+            formats = [f for f in (param or {}).get('formats', []) if f in WIRE_FORMATS] + ['json']
+            session.codec = make_codec(formats[0], self.statusDict)
+            response_dict = {'request_status': 200, 'data': {'format': formats[0], 'statusDict': self.statusDict}}
+        elif cmd == 'observe': #give up control and stay connected read-only
+            self.close_session(session)
+            response_dict = {'request_status': 200, 'data': self.currentStatusID}
+        elif cmd == 'home': #home
+            response_dict = self.home(msg_dict.get('job'))
+        elif cmd == 'pick': #pick
+            response_dict = self.pick(param, msg_dict.get('job'))
+        elif cmd == 'place': #place
+            response_dict = self.place(param, msg_dict.get('job'))
+        elif cmd == 'program': #run list of commands back-to-back
+            response_dict = self.program(param, msg_dict.get('job'))
+        elif cmd == 'lastRun': #how far the latest move or program got, for drivers resuming
+            with self.status_lock:
+                response_dict = {'request_status': 200, 'data': dict(self.lastRun) if self.lastRun else None}
+        elif cmd == 'status': #give status ID
+            response_dict = {'request_status': 200, 'data': self.status(param)}
+        elif cmd == 'getCurrentStatusID':
+            response_dict = {'request_status': 200, 'data': self.getCurrentStatusID()}
+        elif cmd == 'subscribe': #push status events on every change from now on
+            self.subscribers.add(session)
+            with self.status_lock: #history seq the current status was reached at
+                response_dict = {'request_status': 200, 'data': dict(self.status_event_data(), seq=self.history.seq)}
+        elif cmd == 'history': #every status transition after sequence number param
+            response_dict = {'request_status': 200, 'data': self.history.since(param or 0)}
+        elif cmd == 'metrics': #counters and latency histograms of the simulator
+            response_dict = {'request_status': 200, 'data': self.metrics.snapshot()}
+        else: #unknown command response
+            response_dict = {'request_status': 400, 'data': 'UNKNOWN COMMAND'}
+        return response_dict
+
+    def status_event_data(self):
+        #current status ID and its meaning, as given to subscribers
+        return {'statusID': self.currentStatusID, 'status': self.status(self.currentStatusID)}
+
+    def set_status(self, statusID, command=None):
+        '''
+        Updates current process status, records the transition in history and
+        pushes it to subscribed drivers if it changed
+        Callers hold status_lock so transitions and their events stay in order
+
+        Arguments:
+            statusID: int representing new process status
+            command: string of command that caused the change, ie. 'pick'
+        '''
+        if statusID == self.currentStatusID:
+            return
+        self.currentStatusID = statusID
+        self.history.record(self.engine.clock.now(), statusID, command)
+        self.push_event('status', self.status_event_data())
+
+    def push_event(self, event, data):
+        '''
+        Pushes event to every subscribed connection, only queuing it so no socket
+        is written while status_lock is held
+
+        Arguments:
+            event: string representing kind of event, ie. 'status'
+            data: JSON-able content of the event
+        '''
+        event_dict = {'request_status': 200, 'event': event, 'data': data}
+        payloads = {} #encode once per wire format, not once per subscriber
+        self.metrics.count(f'events.{event}', len(self.subscribers))
+        for session in list(self.subscribers):
+            codec = session.codec
+            if codec.name not in payloads:
+                payloads[codec.name] = codec.encode(event_dict)
+            if self.recorder != None:
+                self.recorder.record(TO_DRIVER, session.id, codec.name, payloads[codec.name])
+            session.push(payloads[codec.name])
+
+    def home(self, job=None):
         #start fake homing process (2 seconds for testing)
-        home_thread = threading.Thread(target=self.moveRobot, args=(2,))
-        home_thread.start()
-        self.currentStatusID = 101 #update status
-        response_dict = {'request_status': 200, 'data': self.currentStatusID}
-        response = json.dumps(response_dict).encode(self.FORMAT)
-        return response
-
-    def pick(self, sourceLocation):
-        #send error if in progress with negative processID
-        if self.currentStatusID == 101:
-            return {'request_status': 400, 'data': -300}
+        return self.moveRobot(self.opDurations['home'], ['home', None], job)
 
+    def pick(self, sourceLocation, job=None):
         #start fake picking process (5 seconds for testing)
-        pick_thread = threading.Thread(target=self.moveRobot, args=(5,))
-        pick_thread.start()
-        self.currentStatusID = 101 #update status
-        response_dict = {'request_status': 200, 'data': self.currentStatusID}
-        response = json.dumps(response_dict).encode(self.FORMAT)
-        return response
-
-    def place(self, destinationLocation):
-        #send error if in progress with negative processID
-        if self.currentStatusID == 101:
-            return {'request_status': 400, 'data': -300}
+        return self.moveRobot(self.opDurations['pick'], ['pick', sourceLocation], job)
 
+    def place(self, destinationLocation, job=None):
         #start fake placing process (5 seconds for testing)
-        place_thread = threading.Thread(target=self.moveRobot, args=(5,))
-        place_thread.start()
-        self.currentStatusID = 101 #update status
-        response_dict = {'request_status': 200, 'data': self.currentStatusID}
-        response = json.dumps(response_dict).encode(self.FORMAT)
-        return response
+        return self.moveRobot(self.opDurations['place'], ['place', destinationLocation], job)
+
+    def program(self, steps, job=None):
+        '''
+        Runs a whole command program back-to-back on the motion engine, status stays
+        In Progress until the last step finishes and a progress event is pushed per step
+
+        Arguments:
+            steps: list of lists of commands and arguments, ie. [['pick', 2], ['place', 1]]
+            job: int the driver tagged the program with, given back by lastRun
+
+        Returns: response dict with new process status, or error if in progress or bad program
+        '''
+        #check whole program before the robot moves at all
+        if not isinstance(steps, list) or steps == []:
+            return {'request_status': 400, 'data': 'BAD PROGRAM'}
+        for i, step in enumerate(steps):
+            if not isinstance(step, list) or len(step) != 2 or step[0] not in self.opDurations:
+                return {'request_status': 400, 'data': f'BAD PROGRAM STEP {i}'}
+
+        with self.status_lock:
+            if self.currentStatusID != 101: #plates must be where every step expects them
+                error = self.registry.validate(steps)
+                if error != None:
+                    return {'request_status': 400, 'data': error}
+            response_dict = self.moveRobot(self.opDurations[steps[0][0]], steps[0], job)
+            if response_dict['request_status'] == 200:
+                self.programSteps = steps
+                self.programIndex = 0
+                self.lastRun['steps'] = steps
+            return response_dict
 
     def status(self, processID):
         #convert statusID(int) to processStatus(str)
@@ -136,22 +496,126 @@ class mockrobot_API():
         #gives current process statusID (int)
         return self.currentStatusID
 
-    def moveRobot(self, op_time):
+    def moveRobot(self, op_time, step, job=None):
         '''
-        Simulate robot move and interrupts/updates process status when driver aborts in progress
+        Simulate robot move by scheduling its completion on the motion engine
         
         Arguments:
-            op_time: int representing seconds for operation
-        '''
-        update_rate = 0.05
-        timer = 0
-        while timer < op_time: #while timer is still ticking
-            if self.main_addr == None: #if disconnected, give terminated error
-                self.currentStatusID = 103 
-                return #exit robot move
-            timer += update_rate
-            time.sleep(update_rate)
-        self.currentStatusID = 102 #give postive ID if successful
-
-test_API = mockrobot_API()
-test_API.start_server()
+            op_time: int or float representing simulated seconds for operation
+            step: list of command and argument, ie. ['pick', 2]
+            job: int the driver tagged the move with, given back by lastRun
+
+        Returns: response dict with new process status, or error if in progress
+                 or move is impossible
+        '''
+        with self.status_lock:
+            #send error if in progress with negative processID
+            if self.currentStatusID == 101:
+                return {'request_status': 400, 'data': -300}
+            #refuse impossible moves before robot moves at all
+            error = self.registry.reserve(*step)
+            if error != None:
+                self.metrics.count('moves_refused')
+                return {'request_status': 400, 'data': error}
+            self.set_status(101, step[0]) #update status
+            self.lastRun = {'job': job, 'steps': [step], 'completed': 0, 'statusID': 101}
+            self.start_step(step, op_time)
+            return {'request_status': 200, 'data': self.currentStatusID}
+
+    def start_step(self, step, op_time):
+        #schedules completion of a move whose location is already reserved, after arm travels to it
+        target = (0, 0) if step[0] == 'home' else self.coords.get(str(step[1]), self.armAt)
+        if self.armSpeed != None:
+            op_time += math.hypot(target[0] - self.armAt[0], target[1] - self.armAt[1]) / self.armSpeed
+        self.armAt = target
+        self.moveStep = step
+        self.moveStarted = self.engine.clock.now()
+        self.move = self.engine.schedule(op_time, self.finish_move)
+
+    def finish_move(self, timer):
+        #called by motion engine at deadline, give postive ID if successful
+        with self.status_lock:
+            if timer is not self.move: #move was aborted just before deadline
+                return
+            self.move = None
+            self.registry.complete(*self.moveStep)
+            self.lastRun['completed'] += 1
+            self.metrics.count('moves_completed')
+            self.metrics.observe(f'operation.{self.moveStep[0]}', self.engine.clock.now() - self.moveStarted)
+            if self.programSteps != None:
+                self.push_progress(102)
+                self.programIndex += 1
+                if self.programIndex < len(self.programSteps): #start next step right away
+                    step = self.programSteps[self.programIndex]
+                    if self.registry.reserve(*step) != None: #deck changed under the program
+                        self.push_progress(103)
+                        self.programSteps = None
+                        self.lastRun['statusID'] = 103
+                        self.set_status(103, step[0])
+                        return
+                    self.start_step(step, self.opDurations[step[0]])
+                    return
+                self.programSteps = None
+            self.lastRun['statusID'] = 102
+            self.set_status(102, self.moveStep[0])
+
+    def abort_move(self):
+        #interrupts robot move in progress and gives terminated error at once
+        with self.status_lock:
+            if self.move == None:
+                return
+            self.engine.cancel(self.move)
+            self.move = None
+            self.registry.abort(*self.moveStep)
+            self.metrics.count('moves_aborted')
+            if self.programSteps != None: #report which step was cut short
+                self.push_progress(103)
+                self.programSteps = None
+            self.lastRun['statusID'] = 103
+            self.set_status(103, self.moveStep[0])
+
+    def push_progress(self, statusID):
+        #tells subscribers how the current program step ended and when, on the robot's clock
+        step, param = self.programSteps[self.programIndex]
+        self.push_event('progress', {
+            'step': self.programIndex,
+            'steps': len(self.programSteps),
+            'command': step,
+            'param': param,
+            'statusID': statusID,
+            'status': self.status(statusID),
+            'started': self.moveStarted,
+            'finished': self.engine.clock.now(),
+        })
+
+
+def main():
+    '''Runs simulator from the command line until interrupted'''
+    parser = argparse.ArgumentParser(description='MockRobot simulator')
+    parser.add_argument('--listen', default=None,
+                        help='transport address, ie. tcp://127.0.0.1:1000 (default), '
+                             'unix:///tmp/mockrobot.sock')
+    parser.add_argument('--async', dest='use_async', action='store_true',
+                        help='event-loop server for many observer connections')
+    parser.add_argument('--speedup', type=float, default=1,
+                        help='run simulated time this many times faster than real time')
+    parser.add_argument('--virtual', action='store_true',
+                        help='discrete-event time, every move completes at once')
+    parser.add_argument('--record', default=None,
+                        help='capture every message to this file, for replay.py')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    test_API = mockrobot_API(clock=make_clock(args.speedup, args.virtual), recorder=args.record)
+    try:
+        if args.use_async:
+            asyncio.run(test_API.start_async_server(args.listen))
+        else:
+            test_API.start_server(args.listen)
+    finally: #ie. Ctrl+C, keep what was captured
+        test_API.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+'''Python 3.9.4'''
+import threading
+import heapq
+import itertools
+
+from simclock import RealClock
+
+
+class MotionTimer():
+    '''Handle of one scheduled robot move, given back by MotionEngine.schedule'''
+    def __init__(self, deadline, callback):
+        self.deadline = deadline #float: clock time the move completes at
+        self.callback = callback #function called with this timer at the deadline
+        self.cancelled = False
+
+
+class MotionEngine():
+    '''
+    Single worker thread that completes every scheduled robot move at its
+    deadline on the given clock, instead of one sleeping thread per move
+    '''
+    def __init__(self, clock=None):
+        self.clock = clock or RealClock() #real, sped-up or virtual time
+        self.timers = [] #heap of (deadline, seq, MotionTimer)
+        self.seq = itertools.count() #breaks ties between equal deadlines
+        self.cond = threading.Condition()
+        worker = threading.Thread(target=self.run, daemon=True)
+        worker.start()
+
+    def schedule(self, op_time, callback):
+        '''
+        Schedules callback to fire op_time seconds from now
+
+        Arguments:
+            op_time: int or float representing simulated seconds for operation
+            callback: function called with the MotionTimer when it fires
+
+        Returns: MotionTimer that can be cancelled
+        '''
+        timer = MotionTimer(self.clock.now() + op_time, callback)
+        with self.cond:
+            heapq.heappush(self.timers, (timer.deadline, next(self.seq), timer))
+            self.cond.notify() #deadline may be earlier than the one worker waits on
+        return timer
+
+    def cancel(self, timer):
+        #cancelled timers are dropped when they reach the top of the heap
+        with self.cond:
+            timer.cancelled = True
+            self.cond.notify()
+
+    def run(self):
+        '''Waits for the earliest deadline and fires its callback, forever'''
+        while True:
+            with self.cond:
+                while True:
+                    #drop cancelled timers so they never wake worker up
+                    while self.timers and self.timers[0][2].cancelled:
+                        heapq.heappop(self.timers)
+                    if not self.timers:
+                        self.clock.wait(self.cond)
+                        continue
+                    timeout = self.timers[0][0] - self.clock.now()
+                    if timeout <= 0:
+                        break
+                    self.clock.wait(self.cond, timeout)
+                timer = heapq.heappop(self.timers)[2]
+            #fire outside the lock so callback can schedule or cancel moves
+            timer.callback(timer)
@@ -0,0 +1,161 @@
+'''Python 3.9.4'''
+import math
+
+import scheduler
+
+#deck positions numbered row by row, 20 to a row, one unit apart
+def grid_coords(locations, rowLength=20):
+    return {loc: (int(loc) % rowLength, int(loc) // rowLength) for loc in locations}
+
+
+class TransferPlanner():
+    '''
+    Orders a batch of transfers to cut the arm's empty travel between them,
+    while every location still sees its transfers in the order they were entered
+    (so a destination is always freed before something is placed on it)
+    '''
+    def __init__(self, coords=None, home=(0, 0), armSpeed=1.0, opDurations=None, window=8):
+        '''
+        Arguments:
+            coords: dict of location string -> (x, y), defaults to grid of valid locations
+            home: (x, y) of arm when batch starts
+            armSpeed: float of distance units arm travels per second
+            opDurations: dict of 'pick'/'place' -> seconds, same as mockrobot_API
+            window: int of longest run of transfers 2-opt tries to reverse
+        '''
+        self.coords = coords or grid_coords(scheduler.valid_locations)
+        self.home = home
+        self.armSpeed = armSpeed
+        self.opDurations = {'pick': 5, 'place': 5}
+        self.opDurations.update(opDurations or {})
+        self.window = window
+
+    def distance(self, a, b):
+        #straight line distance between two (x, y) positions
+        return math.hypot(a[0] - b[0], a[1] - b[1])
+
+    def plan(self, transfers):
+        '''
+        Orders transfers by nearest neighbour, then improves order with 2-opt;
+        never gives more travel than the entered order
+
+        Arguments:
+            transfers: list of (source, destination) location pairs
+
+        Returns: list of the same pairs in planned order
+        '''
+        transfers = [(str(src), str(dst)) for src, dst in transfers]
+        for src, dst in transfers:
+            if not scheduler.check_valid_locs([src, dst]) or src not in self.coords or dst not in self.coords:
+                raise ValueError(f'invalid transfer {src} -> {dst}')
+            elif src == dst:
+                raise ValueError(f'cannot transfer {src} to itself')
+        order = self.nearest_neighbour(transfers)
+        order = self.two_opt(transfers, order)
+        planned = [transfers[i] for i in order]
+        #greedy can lose to the entered order, which keeps every location's order too
+        return transfers if self.travel(transfers) < self.travel(planned) else planned
+
+    def nearest_neighbour(self, transfers):
+        #greedy order of transfer indexes, always going to the closest ready source
+        chains = {} #location -> indexes of transfers touching it, in entered order
+        for i, (src, dst) in enumerate(transfers):
+            chains.setdefault(src, []).append(i)
+            chains.setdefault(dst, []).append(i)
+        heads = {loc: 0 for loc in chains} #next position in each chain
+
+        def is_ready(i):
+            #transfer is next in line at both of its locations
+            src, dst = transfers[i]
+            return chains[src][heads[src]] == i and chains[dst][heads[dst]] == i
+
+        ready = {i for i in range(len(transfers)) if is_ready(i)}
+        order = []
+        pos = self.home
+        while ready:
+            #ties go to the transfer entered first so plans are reproducible
+            i = min(ready, key=lambda j: (self.distance(pos, self.coords[transfers[j][0]]), j))
+            ready.remove(i)
+            order.append(i)
+            src, dst = transfers[i]
+            pos = self.coords[dst]
+            for loc in (src, dst):
+                heads[loc] += 1
+                if heads[loc] < len(chains[loc]) and is_ready(chains[loc][heads[loc]]):
+                    ready.add(chains[loc][heads[loc]])
+        return order
+
+    def two_opt(self, transfers, order):
+        '''
+        Reverses short runs of transfers while that shortens the empty travel
+        Only runs whose transfers share no location are reversed, so each
+        location keeps its entered order
+
+        Arguments:
+            transfers: list of (source, destination) location pairs
+            order: list of transfer indexes from nearest_neighbour
+
+        Returns: list of transfer indexes in improved order
+        '''
+        src = [self.coords[s] for s, d in transfers]
+        dst = [self.coords[d] for s, d in transfers]
+        locs = [set(t) for t in transfers]
+        order = list(order)
+        n = len(order)
+
+        def end_of(k):
+            #arm position before order[k] starts
+            return self.home if k < 0 else dst[order[k]]
+
+        improved = True
+        while improved:
+            improved = False
+            for i in range(n - 1):
+                used = set(locs[order[i]])
+                inner = 0.0 #empty travel inside run order[i..j]
+                inner_reversed = 0.0
+                for j in range(i + 1, min(n, i + self.window)):
+                    if used & locs[order[j]]: #reversing would swap order at a location
+                        break
+                    used |= locs[order[j]]
+                    inner += self.distance(dst[order[j - 1]], src[order[j]])
+                    inner_reversed += self.distance(dst[order[j]], src[order[j - 1]])
+                    before = self.distance(end_of(i - 1), src[order[i]]) + inner
+                    after = self.distance(end_of(i - 1), src[order[j]]) + inner_reversed
+                    if j + 1 < n:
+                        before += self.distance(dst[order[j]], src[order[j + 1]])
+                        after += self.distance(dst[order[i]], src[order[j + 1]])
+                    if after < before - 1e-9:
+                        order[i:j + 1] = reversed(order[i:j + 1])
+                        improved = True
+                        break
+        return order
+
+    def travel(self, transfers):
+        #total distance arm moves for transfers done in the given order
+        total = 0.0
+        pos = self.home
+        for src, dst in transfers:
+            total += self.distance(pos, self.coords[str(src)]) + self.distance(self.coords[str(src)], self.coords[str(dst)])
+            pos = self.coords[str(dst)]
+        return total
+
+    def makespan(self, transfers):
+        #simulated seconds to do transfers in the given order, moves plus travel
+        moves = len(transfers) * (self.opDurations['pick'] + self.opDurations['place'])
+        return moves + self.travel(transfers) / self.armSpeed
+
+    def to_queue(self, transfers):
+        '''
+        Converts planned transfers into commands for DriverInterface.ExecuteQueue
+
+        Arguments:
+            transfers: list of (source, destination) location pairs
+
+        Returns: list of lists, ie. [['pick', 2], ['place', 1], ...]
+        '''
+        queue = []
+        for src, dst in transfers:
+            queue.append(['pick', int(src)])
+            queue.append(['place', int(dst)])
+        return queue
@@ -0,0 +1,169 @@
+'''Python 3.9.4'''
+import struct
+import asyncio
+import json
+
+#every message is a 4 byte big-endian length followed by that many bytes
+HEADER = struct.Struct('!I')
+FORMAT = 'utf-8'
+
+
+def pack_frame(payload):
+    '''
+    Puts length header in front of message so it can be read back whole
+
+    Arguments:
+        payload: bytes or string of the message
+
+    Returns: bytes ready to send through TCP/IP
+    '''
+    if isinstance(payload, str):
+        payload = payload.encode(FORMAT)
+    return HEADER.pack(len(payload)) + payload
+
+
+def recv_frame(reader):
+    '''
+    Reads one whole message no matter how TCP/IP split or joined it
+
+    Arguments:
+        reader: binary file object of socket, ie. conn.makefile('rb')
+
+    Returns: bytes of the message, or None if connection closed
+    '''
+    header = reader.read(HEADER.size)
+    if len(header) < HEADER.size: #connection closed
+        return None
+    (size,) = HEADER.unpack(header)
+    payload = reader.read(size)
+    if len(payload) < size: #connection closed mid message
+        return None
+    return payload
+
+
+async def read_frame_async(reader):
+    '''
+    Reads one whole message on the event loop
+
+    Arguments:
+        reader: asyncio.StreamReader of the connection
+
+    Returns: bytes of the message, or None if connection closed
+    '''
+    try:
+        header = await reader.readexactly(HEADER.size)
+        (size,) = HEADER.unpack(header)
+        return await reader.readexactly(size)
+    except asyncio.IncompleteReadError: #connection closed
+        return None
+
+
+class JsonCodec():
+    '''Messages as JSON text, understood by every driver and server'''
+    name = 'json'
+
+    def encode(self, msg_dict):
+        return json.dumps(msg_dict).encode(FORMAT)
+
+    def decode(self, payload):
+        return json.loads(payload)
+
+
+class BinaryCodec():
+    '''
+    Fixed-layout struct messages for requests, responses and status events,
+    anything else (ie. programs, progress events) falls back to JSON inside the frame
+    '''
+    name = 'binary'
+
+    #first byte of every message
+    KIND_JSON = 0
+    KIND_REQUEST = 1
+    KIND_RESPONSE = 2
+    KIND_STATUS = 3
+    REQUEST = struct.Struct('!BBI') #kind, command code, request id
+    RESPONSE = struct.Struct('!BhI') #kind, request status, request id
+    STATUS = struct.Struct('!Bh') #kind, status ID
+    #tag byte in front of param/data, whatever follows the tag is the value
+    TAG_NONE = 0
+    TAG_INT = 1
+    TAG_STR = 2
+    TAG_JSON = 3
+    INT = struct.Struct('!q')
+    COMMANDS = ['getCurrentStatusID', 'status', 'subscribe', 'home', 'pick', 'place',
+                'program', 'disconnect', 'observe', 'hello', 'metrics', 'lastRun', 'history']
+
+    def __init__(self, statusDict):
+        '''
+        Arguments:
+            statusDict: dict of status ID -> process status string, as the server's
+        '''
+        self.statusDict = {int(k): v for k, v in statusDict.items()}
+        self.codes = {cmd: i for i, cmd in enumerate(self.COMMANDS)}
+
+    def encode(self, msg_dict):
+        cmd = msg_dict.get('command')
+        if cmd != None and cmd in self.codes and 'job' not in msg_dict: #job tagged moves go as JSON
+            head = self.REQUEST.pack(self.KIND_REQUEST, self.codes[cmd], msg_dict.get('id') or 0)
+            return head + self.pack_value(msg_dict.get('param'))
+        elif cmd == None and msg_dict.get('event') == 'status':
+            return self.STATUS.pack(self.KIND_STATUS, msg_dict['data']['statusID'])
+        elif cmd == None and 'event' not in msg_dict:
+            head = self.RESPONSE.pack(self.KIND_RESPONSE, msg_dict['request_status'], msg_dict.get('id') or 0)
+            return head + self.pack_value(msg_dict['data'])
+        return bytes([self.KIND_JSON]) + json.dumps(msg_dict).encode(FORMAT)
+
+    def decode(self, payload):
+        kind = payload[0]
+        if kind == self.KIND_REQUEST:
+            _, code, request_id = self.REQUEST.unpack_from(payload)
+            return {'command': self.COMMANDS[code], 'param': self.unpack_value(payload, self.REQUEST.size),
+                    'id': request_id or None}
+        elif kind == self.KIND_RESPONSE:
+            _, request_status, request_id = self.RESPONSE.unpack_from(payload)
+            return {'request_status': request_status, 'data': self.unpack_value(payload, self.RESPONSE.size),
+                    'id': request_id or None}
+        elif kind == self.KIND_STATUS:
+            _, statusID = self.STATUS.unpack(payload)
+            return {'request_status': 200, 'event': 'status',
+                    'data': {'statusID': statusID, 'status': self.statusDict[statusID]}}
+        return json.loads(payload[1:])
+
+    def pack_value(self, value):
+        #ints and strings stay compact, everything else is JSON
+        if value == None:
+            return bytes([self.TAG_NONE])
+        elif type(value) == int and -2**63 <= value < 2**63:
+            return bytes([self.TAG_INT]) + self.INT.pack(value)
+        elif type(value) == str:
+            return bytes([self.TAG_STR]) + value.encode(FORMAT)
+        return bytes([self.TAG_JSON]) + json.dumps(value).encode(FORMAT)
+
+    def unpack_value(self, payload, offset):
+        tag = payload[offset]
+        if tag == self.TAG_NONE:
+            return None
+        elif tag == self.TAG_INT:
+            return self.INT.unpack_from(payload, offset + 1)[0]
+        elif tag == self.TAG_STR:
+            return payload[offset + 1:].decode(FORMAT)
+        return json.loads(payload[offset + 1:])
+
+
+def make_codec(name, statusDict):
+    '''
+    Gives codec agreed on at handshake
+
+    Arguments:
+        name: string of wire format, 'json' or 'binary'
+        statusDict: dict of status ID -> process status string
+
+    Returns: JsonCodec or BinaryCodec
+    '''
+    if name == 'binary':
+        return BinaryCodec(statusDict)
+    return JsonCodec()
+
+
+#wire formats the server understands, in order of preference
+WIRE_FORMATS = ['binary', 'json']
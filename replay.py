@@ -0,0 +1,210 @@
+'''Python 3.9.4'''
+import sys
+import time
+import json
+import argparse
+import logging
+import threading
+
+import scheduler
+import transport
+from capture import read_capture, TO_ROBOT
+from protocol import JsonCodec, make_codec
+from mockrobot_API import mockrobot_API
+from simclock import make_clock
+from metrics import get_logger
+
+log = get_logger('mockrobot.replay')
+
+#responses that depend on when or how often things ran, not compared with the recording
+UNCOMPARED = ['hello', 'metrics', 'history', 'subscribe', 'lastRun']
+
+
+class RecordedSession():
+    '''Requests of one recorded connection, and what came back for each'''
+    def __init__(self, conn):
+        self.conn = conn #int: connection number in the capture
+        self.requests = [] #(seconds, events received before it, request dict)
+        self.responses = {} #request id -> recorded response dict
+        self.events = 0 #int: pushed events received so far while loading
+        self.statusDict = None #dict: server's statuses from hello, to decode binary status events
+
+
+def load_sessions(path):
+    '''
+    Splits capture into connections, decoding each message in the wire format
+    it was recorded in
+
+    Arguments:
+        path: string of capture file from WireRecorder
+
+    Returns: list of RecordedSession in order of their first message
+    '''
+    sessions = {}
+    for seconds, direction, codec, conn, payload in read_capture(path):
+        session = sessions.setdefault(conn, RecordedSession(conn))
+        msg = make_codec(codec, session.statusDict or {}).decode(payload)
+        if direction == TO_ROBOT:
+            session.requests.append((seconds, session.events, msg))
+        elif 'event' in msg:
+            session.events += 1
+        else:
+            session.responses[msg.get('id')] = msg
+            if isinstance(msg.get('data'), dict) and 'statusDict' in msg['data']: #hello response
+                session.statusDict = msg['data']['statusDict']
+    return list(sessions.values())
+
+
+class SessionReplay():
+    '''
+    Re-drives one recorded connection: each request waits until as many events
+    have been pushed as before it in the recording (so moves are only sent once
+    the robot is ready for them), and at a set speed also until its recorded time
+    '''
+    def __init__(self, session, address, speed, started, timeout):
+        '''
+        Arguments:
+            session: RecordedSession to replay
+            address: string of transport address of robot
+            speed: float of times faster than recorded, None for as fast as possible
+            started: float of time.monotonic() the replay started at
+            timeout: float of wall seconds to wait for an event or response before moving on
+        '''
+        self.session = session
+        self.address = address
+        self.speed = speed
+        self.started = started
+        self.timeout = timeout
+        self.codec = JsonCodec() #switched like a driver's on the hello response
+        self.cond = threading.Condition()
+        self.events = 0 #int: events pushed to the replay so far
+        self.responses = {} #request id -> response dict
+        self.closed = False
+        self.sent = 0
+        self.stalls = 0 #int: waits for events or responses that timed out
+        self.mismatches = [] #(request, recorded response, replayed response)
+
+    def receive(self, conn):
+        #reads responses and events until robot closes connection
+        while True:
+            try:
+                msg = conn.recv()
+            except (OSError, ValueError): #closed under us
+                msg = None
+            with self.cond:
+                if msg == None:
+                    self.closed = True
+                    self.cond.notify_all()
+                    return
+                py_dict = self.codec.decode(msg)
+                if 'event' in py_dict:
+                    self.events += 1
+                else:
+                    self.responses[py_dict.get('id')] = py_dict
+                self.cond.notify_all()
+
+    def wait_for(self, ready):
+        #waits until ready() holds, counting a stall if it takes longer than timeout
+        with self.cond:
+            if not self.cond.wait_for(lambda: ready() or self.closed, self.timeout):
+                self.stalls += 1
+
+    def run(self):
+        conn = transport.connect(self.address, self.timeout)
+        conn.recv() #greeting
+        conn.settimeout(None) #receive thread waits for ever, wait_for bounds each wait
+        receive_thread = threading.Thread(target=self.receive, args=(conn,), daemon=True)
+        receive_thread.start()
+        for seconds, events, request in self.session.requests:
+            self.wait_for(lambda: self.events >= events)
+            if self.speed != None:
+                delay = self.started + seconds / self.speed - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            if self.closed:
+                break
+            conn.send(self.codec.encode(request))
+            self.sent += 1
+            if request['command'] == 'hello': #nothing else in flight while formats switch
+                self.wait_for(lambda: request.get('id') in self.responses)
+                data = self.responses.get(request.get('id'), {}).get('data')
+                if isinstance(data, dict):
+                    self.codec = make_codec(data['format'], data['statusDict'])
+        ids = [request.get('id') for seconds, events, request in self.session.requests]
+        self.wait_for(lambda: all(i in self.responses for i in ids if i in self.session.responses))
+        conn.close()
+        for seconds, events, request in self.session.requests:
+            recorded = self.session.responses.get(request.get('id'))
+            replayed = self.responses.get(request.get('id'))
+            if recorded == None or request['command'] in UNCOMPARED:
+                continue
+            if replayed == None or (recorded['request_status'], recorded['data']) != \
+                    (replayed['request_status'], replayed['data']):
+                self.mismatches.append((request, recorded, replayed))
+
+
+def replay(path, address, speed=1.0, timeout=30):
+    '''
+    Re-drives every connection in a capture against a robot at once
+
+    Arguments:
+        path: string of capture file from WireRecorder
+        address: string of transport address of robot to replay against
+        speed: float of times faster than recorded, None for as fast as possible
+        timeout: float of wall seconds to wait for an event or response before moving on
+
+    Returns: dict with requests sent, responses that differ from the recording,
+             stalls and wall seconds taken
+    '''
+    sessions = load_sessions(path)
+    started = time.monotonic()
+    replays = [SessionReplay(session, address, speed, started, timeout) for session in sessions]
+    threads = [threading.Thread(target=r.run, daemon=True) for r in replays]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+    recorded = max((s.requests[-1][0] for s in sessions if s.requests), default=0.0)
+    mismatches = [m for r in replays for m in r.mismatches]
+    sent = sum(r.sent for r in replays)
+    return {
+        'connections': len(sessions),
+        'requests': sent,
+        'mismatches': len(mismatches),
+        'stalls': sum(r.stalls for r in replays),
+        'recorded_seconds': recorded,
+        'replay_seconds': elapsed,
+        'requests_per_s': sent / elapsed if elapsed > 0 else None,
+        'first_mismatches': [{'request': q, 'recorded': a, 'replayed': b} for q, a, b in mismatches[:10]],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Re-drive a wire capture against the simulator')
+    parser.add_argument('capture', help='file recorded with --record or recorder=')
+    parser.add_argument('--speed', default='1',
+                        help='times faster than recorded, ie. 1, 10, or max for no waiting')
+    parser.add_argument('--address', default=None,
+                        help='robot to replay against, default is a fresh in-process simulator '
+                             'whose clock runs at the same speed')
+    parser.add_argument('--timeout', type=float, default=30,
+                        help='wall seconds to wait for an event or response before moving on')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(message)s')
+
+    speed = None if args.speed == 'max' else float(args.speed)
+    address = args.address
+    if address == None: #simulator in this process, its moves sped up like the replay
+        api = mockrobot_API(clock=make_clock(speed or 1, speed == None), registry=scheduler.LocationRegistry())
+        threading.Thread(target=api.start_server, args=('inproc://replay',), daemon=True).start()
+        api.ready.wait(5)
+        address = api.address
+    report = replay(args.capture, address, speed, args.timeout)
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if report['mismatches'] else 0)
+
+
+if __name__ == '__main__':
+    main()
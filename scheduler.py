@@ -1,7 +1,147 @@
 '''Python 3.9.4'''
+import threading
+
 valid_locations = ['1', '2', '3', '6', '12', '38', '80', '10', '20', '345']
 valid_operations = ['Pick', 'Place', 'Transfer']
 valid_names = ['None', 'Source Location', 'Destination Location']
 
+#occupancy codes of LocationRegistry
+UNKNOWN = 0
+EMPTY = 1
+FULL = 2
+
+
+class LocationRegistry():
+    '''
+    Valid locations with plate occupancy and reservations, so impossible moves
+    (pick from an empty slot, place onto a full one) are refused before the robot moves
+    Occupancy starts UNKNOWN and becomes known as plates are picked and placed
+    '''
+    def __init__(self, locations=None):
+        '''
+        Arguments:
+            locations: list of location strings, defaults to valid_locations
+        '''
+        locations = valid_locations if locations == None else locations
+        self.index = {loc: i for i, loc in enumerate(locations)} #location -> slot in arrays
+        self.occupancy = bytearray(len(locations)) #UNKNOWN, EMPTY or FULL per location
+        self.reserved = bytearray(len(locations)) #1 while a move in progress uses location
+        self.gripper = UNKNOWN #EMPTY or FULL once robot has picked or placed
+        self.lock = threading.Lock()
+
+    def is_valid(self, loc):
+        return str(loc) in self.index
+
+    def set_occupancy(self, loc, state):
+        #tells registry what is known to be at a location, ie. from a deck scan
+        with self.lock:
+            self.occupancy[self.index[str(loc)]] = state
+
+    def check(self, cmd, loc, occupancy=None, gripper=None, reserved=None):
+        '''
+        Checks a single command against location and gripper state
+
+        Arguments:
+            cmd: string representing command, ie. 'pick'
+            loc: string or int representing location of command
+            occupancy: bytearray to check against instead of current occupancy
+            gripper: gripper state to check against instead of current one
+            reserved: bytearray of reservations to check against instead of current ones
+
+        Returns: string describing why command is impossible, or None if it is possible
+        '''
+        occupancy = self.occupancy if occupancy == None else occupancy
+        gripper = self.gripper if gripper == None else gripper
+        reserved = self.reserved if reserved == None else reserved
+        if cmd not in ('pick', 'place'): #home etc. do not touch locations
+            return None
+        slot = self.index.get(str(loc))
+        if slot == None:
+            return f'Location {loc} is not valid'
+        elif reserved[slot]:
+            return f'Location {loc} is in use'
+        elif cmd == 'pick' and occupancy[slot] == EMPTY:
+            return f'Location {loc} is empty'
+        elif cmd == 'pick' and gripper == FULL:
+            return 'Gripper is already holding a plate'
+        elif cmd == 'place' and occupancy[slot] == FULL:
+            return f'Location {loc} is full'
+        elif cmd == 'place' and gripper == EMPTY:
+            return 'Gripper is not holding a plate'
+        return None
+
+    def validate(self, queue, pending=()):
+        '''
+        Checks a whole batch in order, as if every earlier command already ran
+        A location reserved by the move in progress is free again once that move,
+        which is among the pending commands, has run
+
+        Arguments:
+            queue: list of lists containing series of commands, ie. [['pick', 2], ['place', 1]]
+            pending: list of commands queued before the batch that will run first
+
+        Returns: string describing the first impossible command, or None if all are possible
+        '''
+        with self.lock:
+            occupancy = bytearray(self.occupancy)
+            gripper = self.gripper
+            reserved = bytearray(self.reserved)
+        for i, step in enumerate(list(pending) + list(queue)):
+            if not isinstance(step, (list, tuple)) or len(step) != 2:
+                return f'Step {i - len(pending) + 1}: Bad command {step}'
+            cmd, loc = step
+            if i >= len(pending): #pending commands were checked when they were queued
+                error = self.check(cmd, loc, occupancy, gripper, reserved)
+                if error != None:
+                    step = i - len(pending) + 1
+                    return f'Step {step} ({cmd} {loc}): {error}' if len(queue) > 1 else error
+            if not self.is_valid(loc):
+                continue
+            if i < len(pending):
+                reserved[self.index[str(loc)]] = 0
+            if cmd == 'pick':
+                occupancy[self.index[str(loc)]] = EMPTY
+                gripper = FULL
+            elif cmd == 'place':
+                occupancy[self.index[str(loc)]] = FULL
+                gripper = EMPTY
+        return None
+
+    def reserve(self, cmd, loc):
+        '''
+        Checks a command and holds its location for the move if it is possible
+
+        Returns: string describing why command is impossible, or None once reserved
+        '''
+        with self.lock:
+            error = self.check(cmd, loc)
+            if error == None and cmd in ('pick', 'place'):
+                self.reserved[self.index[str(loc)]] = 1
+            return error
+
+    def complete(self, cmd, loc):
+        #move finished, plate left or arrived at location
+        if cmd not in ('pick', 'place'):
+            return
+        with self.lock:
+            slot = self.index[str(loc)]
+            self.reserved[slot] = 0
+            self.occupancy[slot] = EMPTY if cmd == 'pick' else FULL
+            self.gripper = FULL if cmd == 'pick' else EMPTY
+
+    def abort(self, cmd, loc):
+        #move cut short, plate could be at location or in gripper
+        if cmd not in ('pick', 'place'):
+            return
+        with self.lock:
+            slot = self.index[str(loc)]
+            self.reserved[slot] = 0
+            self.occupancy[slot] = UNKNOWN
+            self.gripper = UNKNOWN
+
+
+#shared by DriverInterface and mockrobot_API running in the same process
+registry = LocationRegistry()
+
 def check_valid_locs(locs_list):
-    return all(i in valid_locations for i in locs_list if i != '')
\ No newline at end of file
+    return all(registry.is_valid(i) for i in locs_list if i != '')
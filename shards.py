@@ -0,0 +1,240 @@
+'''Python 3.9.4'''
+import os
+import sys
+import time
+import json
+import argparse
+import logging
+import threading
+import multiprocessing
+
+from fleet import RobotFleet
+from simclock import make_clock
+from metrics import get_logger
+
+log = get_logger('mockrobot.shards')
+
+
+def run_shard(shard, count, scheme, name, opDurations, speedup, conn):
+    '''
+    Runs one shard of simulated robots in its own process until told to stop,
+    answering health requests from the supervisor over conn
+
+    Arguments:
+        shard: int index of this shard
+        count: int of robots in this shard
+        scheme: string of transport robots listen on, 'unix' or 'tcp'
+        name: string robot addresses are numbered from
+        opDurations: dict of operation name -> simulated seconds it takes
+        speedup: int or float of how much faster than real time robots run
+        conn: multiprocessing Connection to the supervisor
+    '''
+    try:
+        fleet = RobotFleet(count, make_clock(speedup), opDurations, scheme, name)
+        conn.send(('ready', fleet.start()))
+    except Exception as e: #tell supervisor instead of leaving it waiting
+        conn.send(('error', repr(e)))
+        return
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError: #supervisor went away
+            break
+        if request == 'stop':
+            break
+        elif request == 'health':
+            conn.send(('health', shard_health(fleet)))
+    fleet.stop()
+
+
+def shard_health(fleet):
+    #status and counters of every robot in this process, for the supervisor
+    robots = []
+    for robot in fleet.robots:
+        counters = robot.metrics.snapshot()['counters']
+        robots.append({
+            'address': robot.address,
+            'status': robot.status(robot.currentStatusID),
+            'controlled': robot.main_addr != None,
+            'commands': sum(n for key, n in counters.items() if key.startswith('commands.')),
+            'moves_completed': counters.get('moves_completed', 0),
+        })
+    return {'pid': os.getpid(), 'cpu': time.process_time(), 'time': time.monotonic(),
+            'threads': threading.active_count(), 'robots': robots}
+
+
+class Shard():
+    '''Supervisor's handle of one shard process'''
+    def __init__(self, index, count, process, conn):
+        self.index = index
+        self.count = count #int: robots in the shard
+        self.process = process #multiprocessing.Process running run_shard
+        self.conn = conn #multiprocessing Connection to the shard
+        self.lock = threading.Lock() #one request at a time on conn
+        self.addresses = [] #strings: where the shard's robots listen
+        self.last = None #dict: previous health, to turn CPU seconds into load
+
+
+class ShardSupervisor():
+    '''
+    Spreads simulated robots over one process per core so the GIL of one
+    process does not cap how many robots run, and reports each shard's
+    health and load
+    '''
+    def __init__(self, robots, shards=None, scheme='unix', opDurations=None, speedup=1):
+        '''
+        Arguments:
+            robots: int of simulated robots in all
+            shards: int of processes, defaults to one per core
+            scheme: string of transport robots listen on, 'unix' or 'tcp'
+            opDurations: dict of operation name -> simulated seconds it takes
+            speedup: int or float of how much faster than real time robots run
+        '''
+        if scheme not in ('unix', 'tcp'): #queues do not cross processes
+            raise ValueError('shards listen on unix or tcp')
+        shards = max(1, min(shards or os.cpu_count() or 1, robots))
+        self.counts = [robots // shards + (1 if i < robots % shards else 0) for i in range(shards)]
+        self.scheme = scheme
+        self.opDurations = opDurations
+        self.speedup = speedup
+        self.shards = [] #Shard per process once started
+
+    def start(self, timeout=30):
+        '''
+        Starts every shard process and waits for its robots to listen
+
+        Returns: list of transport address strings of every robot, shard by shard
+        '''
+        for i, count in enumerate(self.counts):
+            parent, child = multiprocessing.Pipe()
+            name = f'mockrobot-{os.getpid()}-shard{i}'
+            process = multiprocessing.Process(target=run_shard, daemon=True, args=(
+                i, count, self.scheme, name, self.opDurations, self.speedup, child))
+            process.start()
+            self.shards.append(Shard(i, count, process, parent))
+        for shard in self.shards:
+            if not shard.conn.poll(timeout):
+                raise OSError(f'shard {shard.index} did not start')
+            kind, data = shard.conn.recv()
+            if kind != 'ready':
+                raise OSError(f'shard {shard.index} failed: {data}')
+            shard.addresses = data
+        self.health() #first sample, so load is known from the next health check on
+        log.info('%s ROBOTS IN %s SHARDS', sum(self.counts), len(self.shards))
+        return self.addresses()
+
+    def addresses(self):
+        return [address for shard in self.shards for address in shard.addresses]
+
+    def stop(self, timeout=5):
+        #asks every shard to stop, kills ones that do not
+        for shard in self.shards:
+            try:
+                with shard.lock:
+                    shard.conn.send('stop')
+            except OSError: #shard already gone
+                pass
+        for shard in self.shards:
+            shard.process.join(timeout)
+            if shard.process.is_alive():
+                shard.process.terminate()
+                shard.process.join()
+
+    def shard_health(self, shard, timeout):
+        '''
+        Asks one shard for its health
+
+        Returns: dict of shard's health, alive False if it died or did not answer
+        '''
+        health = {'shard': shard.index, 'pid': shard.process.pid, 'robots': shard.count,
+                  'alive': shard.process.is_alive(), 'exitcode': shard.process.exitcode}
+        if not health['alive']:
+            return health
+        try:
+            with shard.lock:
+                while shard.conn.poll(): #late answer to a health check that timed out
+                    shard.conn.recv()
+                shard.conn.send('health')
+                if not shard.conn.poll(timeout):
+                    health['alive'] = False
+                    health['error'] = 'no answer'
+                    return health
+                kind, data = shard.conn.recv()
+        except (OSError, EOFError) as e: #pipe broke under us
+            health['alive'] = False
+            health['error'] = repr(e)
+            return health
+        statuses = {}
+        for robot in data['robots']:
+            statuses[robot['status']] = statuses.get(robot['status'], 0) + 1
+        health.update({
+            'status': statuses,
+            'controlled': sum(robot['controlled'] for robot in data['robots']),
+            'commands': sum(robot['commands'] for robot in data['robots']),
+            'moves_completed': sum(robot['moves_completed'] for robot in data['robots']),
+            'threads': data['threads'],
+            'cpu_percent': None,
+        })
+        if shard.last != None: #load since previous health check
+            wall = data['time'] - shard.last['time']
+            if wall > 0:
+                health['cpu_percent'] = (data['cpu'] - shard.last['cpu']) / wall * 100
+                health['commands_per_s'] = (health['commands'] - shard.last['commands']) / wall
+        shard.last = dict(data, commands=health['commands'])
+        return health
+
+    def health(self, timeout=2):
+        '''
+        Polls every shard and sums up the fleet, load is since the previous call
+
+        Returns: dict with per shard health and totals of robots, status and moves
+        '''
+        shards = [self.shard_health(shard, timeout) for shard in self.shards]
+        total = {'shards': len(shards), 'alive': 0, 'robots': 0, 'status': {},
+                 'controlled': 0, 'moves_completed': 0, 'cpu_percent': 0.0}
+        for health in shards:
+            total['robots'] += health['robots']
+            if not health['alive'] or 'status' not in health:
+                continue
+            total['alive'] += 1
+            total['controlled'] += health['controlled']
+            total['moves_completed'] += health['moves_completed']
+            total['cpu_percent'] += health['cpu_percent'] or 0.0
+            for status, n in health['status'].items():
+                total['status'][status] = total['status'].get(status, 0) + n
+        return {'total': total, 'shards': shards}
+
+
+def main():
+    '''Runs sharded simulation from the command line until interrupted'''
+    parser = argparse.ArgumentParser(description='Many simulated robots spread over one process per core')
+    parser.add_argument('--robots', type=int, default=100)
+    parser.add_argument('--shards', type=int, default=None, help='processes, default one per core')
+    parser.add_argument('--transport', default='unix', choices=['unix', 'tcp'])
+    parser.add_argument('--speedup', type=float, default=1,
+                        help='run simulated time this many times faster than real time')
+    parser.add_argument('--addresses', help='write robot addresses here, one per line')
+    parser.add_argument('--interval', type=float, default=5, help='seconds between health reports')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    supervisor = ShardSupervisor(args.robots, args.shards, args.transport, speedup=args.speedup)
+    addresses = supervisor.start()
+    if args.addresses:
+        with open(args.addresses, 'w') as f:
+            f.write('\n'.join(addresses) + '\n')
+    else:
+        print('\n'.join(addresses))
+    try:
+        while True:
+            time.sleep(args.interval)
+            print(json.dumps(supervisor.health()['total']))
+            sys.stdout.flush()
+    except KeyboardInterrupt:
+        pass
+    supervisor.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+'''Python 3.9.4'''
+import time
+import threading
+
+
+class RealClock():
+    '''Simulated time is wall-clock time'''
+    def now(self):
+        #seconds of simulated time, only differences are meaningful
+        return time.monotonic()
+
+    def wait(self, cond, timeout=None):
+        '''
+        Waits on a held Condition until notified or simulated timeout passes
+
+        Arguments:
+            cond: threading.Condition held by caller
+            timeout: float of simulated seconds, None to wait until notified
+        '''
+        cond.wait(timeout)
+
+    def wall_seconds(self, seconds):
+        #wall-clock seconds simulated seconds last, None if they have no wall-clock length
+        return seconds
+
+
+class ScaledClock(RealClock):
+    '''Simulated time runs speedup times faster than wall-clock time'''
+    def __init__(self, speedup):
+        if speedup <= 0:
+            raise ValueError('speedup must be positive')
+        self.speedup = speedup
+
+    def now(self):
+        return time.monotonic() * self.speedup
+
+    def wait(self, cond, timeout=None):
+        cond.wait(None if timeout == None else timeout / self.speedup)
+
+    def wall_seconds(self, seconds):
+        return seconds / self.speedup
+
+
+class VirtualClock(RealClock):
+    '''
+    Discrete-event time: waiting for a deadline jumps simulated time straight
+    to it, so a move takes no wall-clock time however long it lasts
+    '''
+    def __init__(self, start=0.0):
+        self.time = start #float: current simulated seconds
+        self.lock = threading.Lock()
+
+    def now(self):
+        return self.time
+
+    def wait(self, cond, timeout=None):
+        if timeout == None: #nothing scheduled, wait for work
+            cond.wait()
+            return
+        #caller holds cond, so no earlier deadline can be scheduled meanwhile
+        self.advance(timeout)
+
+    def wall_seconds(self, seconds):
+        #simulated time only moves when the robot's moves complete
+        return None
+
+    def advance(self, seconds):
+        #move simulated time forward, never backward
+        with self.lock:
+            if seconds > 0:
+                self.time += seconds
+
+
+def make_clock(speedup=1, virtual=False):
+    '''
+    Builds clock from command line style options
+
+    Arguments:
+        speedup: int or float of how much faster than real time to run
+        virtual: boolean, True for discrete-event time
+
+    Returns: clock object with now and wait
+    '''
+    if virtual:
+        return VirtualClock()
+    if speedup == 1:
+        return RealClock()
+    return ScaledClock(speedup)
@@ -0,0 +1,60 @@
+'''Python 3.9.4'''
+import math
+import unittest
+
+from durations import RunningStats, DurationModel
+
+
+class TestRunningStats(unittest.TestCase):
+    def test_mean_and_sample_std(self):
+        stats = RunningStats()
+        for x in [2, 4, 4, 4, 5, 5, 7, 9]:
+            stats.add(x)
+        self.assertEqual(stats.count, 8)
+        self.assertAlmostEqual(stats.mean, 5.0)
+        self.assertAlmostEqual(stats.std(), math.sqrt(32 / 7))
+        self.assertEqual((stats.min, stats.max), (2, 9))
+
+    def test_single_sample_has_no_spread(self):
+        stats = RunningStats()
+        stats.add(3.5)
+        self.assertEqual(stats.std(), 0.0)
+
+
+class TestDurationModel(unittest.TestCase):
+    def test_prior_until_timed(self):
+        model = DurationModel({'home': 2})
+        self.assertEqual(model.estimate('home'), (2.0, 0.0))
+        self.assertEqual(model.estimate('pick', 1), None)
+        model.observe('home', None, 3.0)
+        self.assertEqual(model.estimate('home'), (3.0, 0.0))
+
+    def test_location_trusted_after_min_samples(self):
+        model = DurationModel(minSamples=3)
+        for n in range(4):
+            model.observe('pick', 1, 4.0)
+        model.observe('pick', 345, 10.0)
+        model.observe('pick', 345, 10.0)
+        #two timings at 345 are not enough, the operation's mean is used
+        self.assertAlmostEqual(model.estimate('pick', 345)[0], 36 / 6)
+        model.observe('pick', '345', 10.0)
+        self.assertEqual(model.estimate('pick', 345), (10.0, 0.0))
+        #a location never timed falls back to the operation too
+        self.assertAlmostEqual(model.estimate('pick', 80)[0], 46 / 7)
+
+    def test_estimate_steps(self):
+        model = DurationModel({'pick': 5, 'place': 5})
+        self.assertEqual(model.estimate_steps([['pick', 2], ['place', 1]]), 10.0)
+        self.assertEqual(model.estimate_steps([]), 0.0)
+        self.assertEqual(model.estimate_steps([['pick', 2], ['home', None]]), None)
+
+    def test_snapshot(self):
+        model = DurationModel()
+        model.observe('place', 6, 5.0)
+        snapshot = model.snapshot()
+        self.assertEqual(snapshot['operations']['place']['count'], 1)
+        self.assertEqual(snapshot['locations']['place 6']['mean'], 5.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+'''Python 3.9.4'''
+import unittest
+
+import scheduler
+from simclock import RealClock
+from driver_interface import DriverInterface, Job
+
+
+class FixedClock(RealClock):
+    '''Driver clock that only moves when a test sets it'''
+    def __init__(self, t=0.0):
+        self.t = t
+
+    def now(self):
+        return self.t
+
+
+#robot's clock is this far ahead of the driver's, as on another host
+ROBOT_OFFSET = 1000.0
+
+
+class TestEta(unittest.TestCase):
+    def setUp(self):
+        self.clock = FixedClock(10.0)
+        self.driver = DriverInterface(clock=self.clock, registry=scheduler.LocationRegistry(),
+                                      durations={'pick': 5, 'place': 5})
+
+    def dispatch(self, job):
+        #hands job to the driver as its dispatcher would
+        job.dispatched = self.clock.now()
+        self.driver.active_job = job
+        return job
+
+    def progress(self, job, step, started, finished, statusID=102):
+        #step ended at driver time finished, stamped by a robot running ROBOT_OFFSET ahead
+        cmd, loc = job.arg[step]
+        self.clock.t = finished
+        job.progress.append({'step': step, 'command': cmd, 'param': loc, 'statusID': statusID,
+                             'started': started + ROBOT_OFFSET, 'finished': finished + ROBOT_OFFSET,
+                             'received': self.clock.now()})
+
+    def test_active_job(self):
+        job = self.dispatch(Job('pick', 1, 10.0))
+        self.assertEqual(self.driver.eta(job), 15.0)
+        self.clock.t = 12.0
+        self.assertEqual(self.driver.eta(job), 15.0)
+        self.clock.t = 16.0 #running late, never predicted in the past
+        self.assertEqual(self.driver.eta(job), 16.0)
+
+    def test_queued_jobs(self):
+        active = self.dispatch(Job('pick', 1, 10.0))
+        place, program = Job('place', 2, 10.0), Job('program', [['pick', 2], ['place', 1]], 10.0)
+        self.driver.jobs.extend([place, program])
+        self.assertEqual(self.driver.eta(place), 20.0)
+        self.assertEqual(self.driver.eta(program), 30.0)
+        self.assertEqual(self.driver.queue_eta(), 30.0)
+        self.assertEqual(self.driver.eta(Job('pick', 3, 10.0)), None)
+        self.driver.jobs.append(Job('home', None, 10.0)) #never timed, no prior
+        self.assertEqual(self.driver.queue_eta(), None)
+        self.assertEqual(self.driver.eta(active), 15.0)
+
+    def test_program_eta_uses_driver_clock_with_robot_offset(self):
+        job = self.dispatch(Job('program', [['pick', 1], ['place', 2]], 10.0))
+        self.progress(job, 0, 10.0, 14.0)
+        #anchored on when the driver heard step 0 end, not the robot's stamp
+        self.assertEqual(self.driver.eta(job), 19.0)
+        self.assertLess(self.driver.eta(job) - self.clock.now(), 10.0)
+
+    def test_durations_use_robot_stamps_only_as_differences(self):
+        job = self.dispatch(Job('program', [['pick', 1], ['place', 2]], 10.0))
+        self.progress(job, 0, 10.0, 14.0)
+        self.progress(job, 1, 14.0, 17.5)
+        job.finished = self.clock.now()
+        self.driver.observe_durations(job, 'Finished Successfully')
+        self.assertEqual(self.driver.durations.estimate('pick', 1), (4.0, 0.0))
+        self.assertEqual(self.driver.durations.estimate('place', 2), (3.5, 0.0))
+
+    def test_failed_step_is_not_timed(self):
+        job = self.dispatch(Job('program', [['pick', 1], ['place', 2]], 10.0))
+        self.progress(job, 0, 10.0, 14.0)
+        self.progress(job, 1, 14.0, 15.0, statusID=103)
+        self.driver.observe_durations(job, 'Terminated With Error')
+        self.assertEqual(self.driver.durations.snapshot()['operations'].keys(), {'pick'})
+
+    def test_overdue_timeout(self):
+        for n in range(3):
+            self.driver.durations.observe('pick', 1, 5.0)
+        job = self.dispatch(Job('pick', 1, 10.0))
+        #no spread yet, so a tenth of the move is allowed past its prediction
+        self.assertAlmostEqual(self.driver.overdue_timeout(job, 0), 5.5)
+        self.assertAlmostEqual(self.driver.overdue_timeout(job, 1), 11.0)
+        self.clock.t = 30.0 #late, prediction is now so the next check is one margin away
+        self.assertAlmostEqual(self.driver.overdue_timeout(job, 0), 0.5)
+
+    def test_overdue_timeout_waits_for_push_when_untimed(self):
+        job = self.dispatch(Job('home', None, 10.0))
+        self.assertEqual(self.driver.overdue_timeout(job, 0), None)
+
+
+class TestStatusOrder(unittest.TestCase):
+    def test_status_asked_before_latest_event_is_dropped(self):
+        driver = DriverInterface(registry=scheduler.LocationRegistry())
+        asked = driver.status_events
+        driver.set_processStatus('In Progress', asked)
+        self.assertEqual(driver.processStatus, 'In Progress')
+        asked = driver.status_events #overdue check sends subscribe
+        driver.status_events += 1 #receive thread applies the pushed end of the move first
+        driver.set_processStatus('Finished Successfully')
+        driver.set_processStatus('In Progress', asked) #then the reply is handed over
+        self.assertEqual(driver.processStatus, 'Finished Successfully')
+
+
+if __name__ == '__main__':
+    unittest.main()
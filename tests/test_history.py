@@ -0,0 +1,42 @@
+'''Python 3.9.4'''
+import unittest
+
+from history import StatusHistory
+
+
+class TestStatusHistory(unittest.TestCase):
+    def test_since(self):
+        history = StatusHistory(8)
+        self.assertEqual(history.record(1.0, 101, 'pick'), 1)
+        self.assertEqual(history.record(6.0, 102, 'pick'), 2)
+        self.assertEqual(history.since(0), {'seq': 2, 'missed': 0, 'reset': False,
+                                            'transitions': [[1, 1.0, 101, 'pick'], [2, 6.0, 102, 'pick']]})
+        self.assertEqual(history.since(1)['transitions'], [[2, 6.0, 102, 'pick']])
+        self.assertEqual(history.since(2)['transitions'], [])
+
+    def test_overwritten_transitions_are_counted_missed(self):
+        history = StatusHistory(4)
+        for n in range(10):
+            history.record(float(n), 101 if n % 2 == 0 else 102, 'place')
+        result = history.since(3)
+        self.assertEqual(result['seq'], 10)
+        self.assertEqual(result['missed'], 3) #4, 5 and 6 were overwritten
+        self.assertEqual([t[0] for t in result['transitions']], [7, 8, 9, 10])
+        self.assertEqual(result['transitions'][-1], [10, 9.0, 102, 'place'])
+
+    def test_seq_from_before_restart_gives_everything(self):
+        history = StatusHistory(4)
+        history.record(0.5, 100)
+        result = history.since(50)
+        self.assertTrue(result['reset'])
+        self.assertEqual(result['transitions'], [[1, 0.5, 100, None]])
+
+    def test_command_names(self):
+        history = StatusHistory(4)
+        for command in ('home', 'pick', 'home', None):
+            history.record(0.0, 101, command)
+        self.assertEqual([t[3] for t in history.since(0)['transitions']], ['home', 'pick', 'home', None])
+
+
+if __name__ == '__main__':
+    unittest.main()
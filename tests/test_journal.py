@@ -0,0 +1,88 @@
+'''Python 3.9.4'''
+import os
+import shutil
+import tempfile
+import unittest
+
+from journal import JobJournal
+
+
+class TestJobJournal(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'jobs.journal')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def reopen(self, journal):
+        journal.close()
+        return JobJournal(self.path)
+
+    def test_unfinished_jobs_survive_reopen(self):
+        journal = JobJournal(self.path)
+        first, second = journal.new_id(), journal.new_id()
+        journal.append({'op': 'submit', 'job': first, 'cmd': 'program', 'arg': [['pick', 1], ['place', 2]]})
+        journal.append({'op': 'submit', 'job': second, 'cmd': 'home', 'arg': None})
+        journal.append({'op': 'dispatch', 'job': first}, sync=True)
+        journal.append({'op': 'step', 'job': first, 'step': 0, 'statusID': 102})
+        journal.append({'op': 'done', 'job': second, 'result': 'Finished Successfully'})
+        journal = self.reopen(journal)
+        unfinished = journal.unfinished()
+        self.assertEqual([state.job for state in unfinished], [first])
+        self.assertTrue(unfinished[0].dispatched)
+        self.assertEqual(unfinished[0].completed, 1)
+        self.assertEqual(unfinished[0].steps(), [['pick', 1], ['place', 2]])
+        journal.close()
+
+    def test_failed_step_does_not_count_as_completed(self):
+        journal = JobJournal(self.path)
+        job = journal.new_id()
+        journal.append({'op': 'submit', 'job': job, 'cmd': 'program', 'arg': [['pick', 1], ['place', 2]]})
+        journal.append({'op': 'step', 'job': job, 'step': 0, 'statusID': 103})
+        self.assertEqual(journal.unfinished()[0].completed, 0)
+        journal.close()
+
+    def test_torn_last_record_is_skipped(self):
+        journal = JobJournal(self.path)
+        job = journal.new_id()
+        journal.append({'op': 'submit', 'job': job, 'cmd': 'pick', 'arg': 3})
+        journal.close()
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write('{"op": "done", "job": ')
+        journal = JobJournal(self.path)
+        self.assertEqual([(s.job, s.cmd, s.arg) for s in journal.unfinished()], [(job, 'pick', 3)])
+        journal.close()
+
+    def test_compact_keeps_only_unfinished(self):
+        journal = JobJournal(self.path)
+        for n in range(50):
+            job = journal.new_id()
+            journal.append({'op': 'submit', 'job': job, 'cmd': 'home', 'arg': None})
+            journal.append({'op': 'done', 'job': job, 'result': 'Finished Successfully'})
+        journal = self.reopen(journal)
+        with open(self.path, encoding='utf-8') as f:
+            self.assertLessEqual(len(f.readlines()), 1)
+        self.assertEqual(journal.unfinished(), [])
+        journal.close()
+
+    def test_ids_are_not_reused_after_compaction(self):
+        journal = JobJournal(self.path)
+        for n in range(3):
+            job = journal.new_id()
+            journal.append({'op': 'submit', 'job': job, 'cmd': 'home', 'arg': None})
+            journal.append({'op': 'done', 'job': job, 'result': 'Finished Successfully'})
+        journal = self.reopen(journal)
+        journal = self.reopen(journal) #compacted twice with nothing unfinished
+        self.assertEqual(journal.new_id(), 4)
+        journal.close()
+
+    def test_closed_journal_refuses_records(self):
+        journal = JobJournal(self.path)
+        journal.close()
+        with self.assertRaises(ValueError):
+            journal.append({'op': 'submit', 'job': 1, 'cmd': 'home', 'arg': None})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+'''Python 3.9.4'''
+import random
+import unittest
+
+import scheduler
+from planner import TransferPlanner
+
+
+def random_transfers(rng, count):
+    #any two different valid locations, so locations are shared often
+    return [tuple(rng.sample(scheduler.valid_locations, 2)) for n in range(count)]
+
+
+def location_orders(transfers):
+    #location -> transfers touching it, in the order they run
+    orders = {}
+    for src, dst in transfers:
+        orders.setdefault(src, []).append((src, dst))
+        orders.setdefault(dst, []).append((src, dst))
+    return orders
+
+
+class TestTransferPlanner(unittest.TestCase):
+    def setUp(self):
+        self.planner = TransferPlanner()
+        self.batches = [random_transfers(random.Random(seed), random.Random(seed).randint(1, 40))
+                        for seed in range(300)]
+
+    def test_plan_keeps_the_same_transfers(self):
+        for batch in self.batches:
+            plan = self.planner.plan(batch)
+            self.assertEqual(sorted(plan), sorted((str(s), str(d)) for s, d in batch))
+
+    def test_each_location_keeps_entered_order(self):
+        for batch in self.batches:
+            self.assertEqual(location_orders(self.planner.plan(batch)), location_orders(batch))
+
+    def test_two_opt_only_reverses_runs_without_shared_locations(self):
+        for batch in self.batches:
+            order = self.planner.two_opt(batch, self.planner.nearest_neighbour(batch))
+            self.assertEqual(location_orders([batch[i] for i in order]), location_orders(batch))
+
+    def test_destination_freed_before_place(self):
+        #6 must be emptied by the first transfer before the second places on it
+        plan = self.planner.plan([('6', '345'), ('1', '6'), ('2', '3')])
+        self.assertLess(plan.index(('6', '345')), plan.index(('1', '6')))
+
+    def test_travel_never_worse_than_entered(self):
+        for batch in self.batches:
+            self.assertLessEqual(self.planner.travel(self.planner.plan(batch)), self.planner.travel(batch) + 1e-9)
+
+    def test_plan_shortens_long_batch(self):
+        batch = random_transfers(random.Random(0), 200)
+        self.assertLess(self.planner.travel(self.planner.plan(batch)), self.planner.travel(batch))
+
+    def test_invalid_transfers_rejected(self):
+        with self.assertRaisesRegex(ValueError, 'invalid transfer'):
+            self.planner.plan([('1', '2'), ('1', '999')])
+        with self.assertRaisesRegex(ValueError, 'to itself'):
+            self.planner.plan([(2, 2)])
+
+    def test_to_queue(self):
+        self.assertEqual(self.planner.to_queue([('2', '1'), ('3', '6')]),
+                         [['pick', 2], ['place', 1], ['pick', 3], ['place', 6]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+'''Python 3.9.4'''
+import unittest
+
+from protocol import JsonCodec, BinaryCodec, make_codec
+
+STATUSES = {100: 'Idle', 101: 'In Progress', 102: 'Finished Successfully',
+            103: 'Terminated With Error', -300: 'Bad Request, In Progress'}
+
+
+class TestBinaryCodec(unittest.TestCase):
+    def setUp(self):
+        self.codec = BinaryCodec(STATUSES)
+
+    def roundtrip(self, msg_dict):
+        return self.codec.decode(self.codec.encode(msg_dict))
+
+    def test_requests(self):
+        for param in (None, 7, -1, 'abc', [['pick', 2], ['place', 1]], {'formats': ['binary']}):
+            msg = {'command': 'pick', 'param': param, 'id': 42}
+            self.assertEqual(self.roundtrip(msg), msg)
+
+    def test_request_without_id(self):
+        self.assertEqual(self.roundtrip({'command': 'hello', 'param': None, 'id': None}),
+                         {'command': 'hello', 'param': None, 'id': None})
+
+    def test_responses(self):
+        for data in (102, 'READ ONLY CONNECTION', {'status': 'Idle', 'seq': 3}, None):
+            msg = {'request_status': 400, 'data': data, 'id': 9}
+            self.assertEqual(self.roundtrip(msg), msg)
+
+    def test_status_event_is_compact(self):
+        msg = {'request_status': 200, 'event': 'status', 'data': {'statusID': -300, 'status': STATUSES[-300]}}
+        payload = self.codec.encode(msg)
+        self.assertEqual(len(payload), BinaryCodec.STATUS.size)
+        self.assertEqual(self.codec.decode(payload), msg)
+
+    def test_json_fallback(self):
+        progress = {'request_status': 200, 'event': 'progress', 'data': {'step': 0, 'statusID': 102}}
+        self.assertEqual(self.roundtrip(progress), progress)
+        tagged = {'command': 'pick', 'param': 2, 'id': 5, 'job': 11} #job tags do not fit the struct
+        self.assertEqual(self.codec.encode(tagged)[0], BinaryCodec.KIND_JSON)
+        self.assertEqual(self.roundtrip(tagged), tagged)
+        unknown = {'command': 'dance', 'param': None, 'id': 1}
+        self.assertEqual(self.roundtrip(unknown), unknown)
+
+    def test_status_dict_from_json_keys(self):
+        codec = BinaryCodec({str(k): v for k, v in STATUSES.items()}) #as received in hello
+        event = {'request_status': 200, 'event': 'status', 'data': {'statusID': 101, 'status': 'In Progress'}}
+        self.assertEqual(codec.decode(self.codec.encode(event)), event)
+
+    def test_command_codes_only_grow(self):
+        #codes are on the wire, older drivers and servers rely on their positions
+        self.assertEqual(BinaryCodec.COMMANDS[:10], ['getCurrentStatusID', 'status', 'subscribe', 'home', 'pick',
+                                                     'place', 'program', 'disconnect', 'observe', 'hello'])
+
+
+class TestMakeCodec(unittest.TestCase):
+    def test_formats(self):
+        self.assertIsInstance(make_codec('binary', STATUSES), BinaryCodec)
+        self.assertIsInstance(make_codec('json', STATUSES), JsonCodec)
+
+    def test_json_roundtrip(self):
+        msg = {'command': 'program', 'param': [['pick', 2]], 'id': 3, 'job': 1}
+        self.assertEqual(JsonCodec().decode(JsonCodec().encode(msg)), msg)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+'''Python 3.9.4'''
+import unittest
+
+import scheduler
+from scheduler import LocationRegistry, EMPTY, FULL, UNKNOWN
+
+
+class TestLocationRegistry(unittest.TestCase):
+    def setUp(self):
+        self.registry = LocationRegistry(['1', '2', '3'])
+
+    def test_unknown_deck_allows_moves(self):
+        self.assertIsNone(self.registry.check('pick', 1))
+        self.assertIsNone(self.registry.check('place', '2'))
+        self.assertIsNone(self.registry.check('home', None))
+
+    def test_invalid_location(self):
+        self.assertEqual(self.registry.check('pick', 9), 'Location 9 is not valid')
+        self.assertFalse(self.registry.is_valid(9))
+
+    def test_occupancy_and_gripper(self):
+        self.registry.set_occupancy(1, EMPTY)
+        self.registry.set_occupancy(2, FULL)
+        self.assertEqual(self.registry.check('pick', 1), 'Location 1 is empty')
+        self.assertEqual(self.registry.check('place', 2), 'Location 2 is full')
+        self.registry.complete('pick', 2)
+        self.assertEqual(self.registry.check('pick', 3), 'Gripper is already holding a plate')
+        self.registry.complete('place', 1)
+        self.assertEqual(self.registry.check('place', 3), 'Gripper is not holding a plate')
+
+    def test_validate_simulates_batch_in_order(self):
+        self.registry.set_occupancy(1, FULL)
+        self.registry.set_occupancy(2, EMPTY)
+        self.assertIsNone(self.registry.validate([['pick', 1], ['place', 2], ['pick', 2], ['place', 1]]))
+        self.assertEqual(self.registry.validate([['pick', 1], ['pick', 3]]),
+                         'Step 2 (pick 3): Gripper is already holding a plate')
+        self.assertEqual(self.registry.validate([['pick', 1]], pending=[['pick', 1], ['place', 2]]),
+                         'Location 1 is empty')
+        self.assertEqual(self.registry.validate([['pick']]), 'Step 1: Bad command [\'pick\']')
+
+    def test_validate_does_not_change_registry(self):
+        self.registry.set_occupancy(1, FULL)
+        self.registry.validate([['pick', 1], ['place', 2]])
+        self.assertEqual(self.registry.occupancy[0], FULL)
+        self.assertEqual(self.registry.gripper, UNKNOWN)
+
+    def test_reservation_of_pending_move_is_released(self):
+        #pick 1 in progress and pending, place 1 after it is possible
+        self.assertIsNone(self.registry.reserve('pick', 1))
+        self.assertIsNone(self.registry.validate([['place', 1]], pending=[['pick', 1]]))
+        self.assertEqual(self.registry.reserved[0], 1)
+
+    def test_reservation_outside_pending_is_refused(self):
+        self.assertIsNone(self.registry.reserve('pick', 1))
+        self.assertEqual(self.registry.validate([['place', 1]]), 'Location 1 is in use')
+        self.assertEqual(self.registry.validate([['place', 1]], pending=[['pick', 2]]), 'Location 1 is in use')
+
+    def test_reserve_complete_abort(self):
+        self.assertIsNone(self.registry.reserve('pick', 1))
+        self.assertEqual(self.registry.reserve('place', 1), 'Location 1 is in use')
+        self.registry.complete('pick', 1)
+        self.assertEqual(self.registry.reserved[0], 0)
+        self.assertEqual(self.registry.occupancy[0], EMPTY)
+        self.assertEqual(self.registry.gripper, FULL)
+        self.assertIsNone(self.registry.reserve('place', 2))
+        self.registry.abort('place', 2)
+        self.assertEqual(self.registry.reserved[1], 0)
+        self.assertEqual(self.registry.occupancy[1], UNKNOWN)
+        self.assertEqual(self.registry.gripper, UNKNOWN)
+
+    def test_default_locations(self):
+        self.assertTrue(all(LocationRegistry().is_valid(loc) for loc in scheduler.valid_locations))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,216 @@
+'''Python 3.9.4'''
+import os
+import queue
+import socket
+import threading
+import itertools
+
+from protocol import pack_frame, recv_frame
+
+#addresses look like 'tcp://127.0.0.1:1000', 'unix:///tmp/mockrobot.sock' or 'inproc://robot'
+SCHEMES = ['tcp', 'unix', 'inproc']
+
+
+def parse_address(address):
+    '''
+    Splits transport address into its scheme and where to connect
+
+    Arguments:
+        address: string, ie. 'tcp://127.0.0.1:1000'
+
+    Returns: (scheme, location) where location is (host, port) for tcp,
+             socket path for unix and name for inproc
+    '''
+    scheme, sep, rest = address.partition('://')
+    if sep == '' or scheme not in SCHEMES or rest == '':
+        raise ValueError(f'invalid transport address {address}')
+    if scheme == 'tcp':
+        host, _, port = rest.rpartition(':')
+        if host == '' or not port.isdigit():
+            raise ValueError(f'invalid transport address {address}')
+        return scheme, (host.strip('[]'), int(port))
+    return scheme, rest
+
+
+class SocketConnection():
+    '''Length-prefixed messages over a TCP or Unix domain stream socket'''
+    def __init__(self, sock, peer):
+        self.sock = sock
+        self.peer = peer #tuple or string of the other end, for logging
+        self.reader = sock.makefile('rb')
+        if sock.family != getattr(socket, 'AF_UNIX', None): #small messages go out at once
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def send(self, payload):
+        self.sock.sendall(pack_frame(payload))
+
+    def recv(self):
+        #bytes of next message, None once connection closed
+        return recv_frame(self.reader)
+
+    def settimeout(self, seconds):
+        #seconds recv waits before raising socket.timeout, None to wait for ever
+        self.sock.settimeout(seconds)
+
+    def close(self):
+        try: #wake up a thread blocked reading this socket
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError: #other end already closed it
+            pass
+        self.reader.close()
+        self.sock.close()
+
+
+class QueueConnection():
+    '''
+    One end of an in-process connection: messages are handed to the other end
+    as the same bytes objects, with no framing, copying or kernel socket
+    '''
+    def __init__(self, inbox, outbox, link, peer):
+        self.inbox = inbox #queue.SimpleQueue this end reads from
+        self.outbox = outbox #queue.SimpleQueue the other end reads from
+        self.link = link #threading.Event shared by both ends, set once either closes
+        self.peer = peer #string of the other end, for logging
+        self.timeout = None #float: seconds recv waits, None to wait for ever
+
+    def send(self, payload):
+        if self.link.is_set():
+            raise BrokenPipeError('in-process connection closed')
+        self.outbox.put(payload)
+
+    def recv(self):
+        #None is put on both queues when either end closes
+        try:
+            return self.inbox.get(timeout=self.timeout)
+        except queue.Empty:
+            raise socket.timeout('in-process connection timed out')
+
+    def settimeout(self, seconds):
+        #seconds recv waits before raising socket.timeout, None to wait for ever
+        self.timeout = seconds
+
+    def close(self):
+        if not self.link.is_set():
+            self.link.set()
+            self.outbox.put(None)
+            self.inbox.put(None)
+
+
+class SocketListener():
+    '''Accepts connections on a bound and listening TCP or Unix domain socket'''
+    def __init__(self, sock, address, path=None, port=None):
+        self.sock = sock
+        self.address = address #string: transport address actually bound, port resolved
+        self.path = path #string: socket file to remove on close, unix only
+        self.port = port #int: TCP port bound, tcp only
+
+    def accept(self):
+        conn, addr = self.sock.accept()
+        return SocketConnection(conn, addr or self.address)
+
+    def close(self):
+        self.sock.close()
+        if self.path != None and os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+#name -> InProcessListener, so drivers in the same process can find their robot
+inproc_listeners = {}
+inproc_lock = threading.Lock()
+
+
+class InProcessListener():
+    '''Accepts in-process connections made with connect('inproc://name')'''
+    def __init__(self, name):
+        with inproc_lock:
+            if name in inproc_listeners:
+                raise OSError(f'inproc://{name} already in use')
+            inproc_listeners[name] = self
+        self.name = name
+        self.address = f'inproc://{name}'
+        self.pending = queue.SimpleQueue() #server ends of connections not yet accepted
+        self.clients = itertools.count(1)
+
+    def connect(self):
+        #pair of queue ends, server end waits for accept and client end is returned
+        to_server, to_client = queue.SimpleQueue(), queue.SimpleQueue()
+        link = threading.Event()
+        peer = f'{self.address}#{next(self.clients)}'
+        self.pending.put(QueueConnection(to_server, to_client, link, peer))
+        return QueueConnection(to_client, to_server, link, self.address)
+
+    def accept(self):
+        conn = self.pending.get()
+        if conn == None:
+            raise OSError(f'{self.address} closed')
+        return conn
+
+    def close(self):
+        with inproc_lock:
+            if inproc_listeners.get(self.name) is self:
+                del inproc_listeners[self.name]
+        self.pending.put(None)
+
+
+def listen(address, backlog=1024):
+    '''
+    Starts listening for drivers on transport address
+
+    Arguments:
+        address: string, ie. 'tcp://127.0.0.1:0' (0 picks a free port),
+                 'unix:///tmp/mockrobot.sock' or 'inproc://robot'
+        backlog: int of connections the kernel queues before accept
+
+    Returns: SocketListener or InProcessListener with accept() and close()
+    '''
+    scheme, location = parse_address(address)
+    if scheme == 'inproc':
+        return InProcessListener(location)
+    if scheme == 'unix':
+        if not hasattr(socket, 'AF_UNIX'):
+            raise ValueError('unix domain sockets not supported on this platform')
+        if os.path.exists(location): #left behind by a server that did not close
+            os.unlink(location)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(location)
+        sock.listen(backlog)
+        return SocketListener(sock, address, location)
+    sock = socket.socket(socket.AF_INET6 if ':' in location[0] else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1) #restart without waiting out TIME_WAIT
+    sock.bind(location)
+    sock.listen(backlog)
+    port = sock.getsockname()[1] #port 0 binds to a free ephemeral port
+    return SocketListener(sock, f'tcp://{location[0]}:{port}', port=port)
+
+
+def connect(address, timeout=None):
+    '''
+    Connects to robot listening on transport address
+
+    Arguments:
+        address: string, ie. 'tcp://127.0.0.1:1000'
+        timeout: float of seconds connecting, and then each recv until settimeout
+                 changes it, may take before raising socket.timeout; None for no limit
+
+    Returns: SocketConnection or QueueConnection with send(), recv(), settimeout() and close()
+    '''
+    scheme, location = parse_address(address)
+    if scheme == 'inproc':
+        with inproc_lock:
+            listener = inproc_listeners.get(location)
+        if listener == None:
+            raise ConnectionRefusedError(f'nothing listening on {address}')
+        conn = listener.connect()
+        conn.settimeout(timeout)
+        return conn
+    if scheme == 'unix':
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    else:
+        sock = socket.socket(socket.AF_INET6 if ':' in location[0] else socket.AF_INET, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(location)
+    except OSError:
+        sock.close()
+        raise
+    return SocketConnection(sock, address)